@@ -0,0 +1,16 @@
+"""
+Download an athlete's full Strava activity history with resumable checkpoints.
+
+Usage:
+    python auth_scripts/backfill.py data/ --details --streams
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from strava_server.backfill import main
+
+
+if __name__ == "__main__":
+    main()
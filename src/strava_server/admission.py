@@ -0,0 +1,142 @@
+import asyncio
+import hashlib
+import heapq
+import itertools
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List
+
+UPSTREAM_CONCURRENCY = int(os.getenv("STRAVA_UPSTREAM_CONCURRENCY", "16"))
+UPSTREAM_PER_TOKEN = int(os.getenv("STRAVA_UPSTREAM_PER_TOKEN", "4"))
+ANALYSIS_CONCURRENCY = int(os.getenv("STRAVA_ANALYSIS_CONCURRENCY", str(os.cpu_count() or 2)))
+ANALYSIS_PER_TOKEN = int(os.getenv("STRAVA_ANALYSIS_PER_TOKEN", "1"))
+
+
+def token_label(token: str) -> str:
+    """Short, non-reversible label for a token in metrics."""
+    return hashlib.sha256((token or "").encode()).hexdigest()[:8]
+
+
+def stream_cost(streams: dict) -> float:
+    """Scheduling cost of analysing key_by_type streams: one unit per hour of 1 Hz samples."""
+    samples = max((len(s.get("data") or []) for s in streams.values() if isinstance(s, dict)), default=0)
+    return max(1.0, samples / 3600)
+
+
+class FairScheduler:
+    """Admission control with per-token concurrency limits and weighted fair queuing.
+
+    At most ``capacity`` holders run at once and at most ``per_token`` of them
+    for the same token. Waiters are admitted in order of their virtual finish
+    time: each request's tag is the later of the scheduler's virtual time and
+    its token's previous tag, plus its ``cost``. A tenant issuing many (or
+    expensive) requests therefore queues behind tenants issuing few, instead
+    of in arrival order.
+    """
+
+    def __init__(self, name: str, capacity: int, per_token: int) -> None:
+        self.name = name
+        self.capacity = capacity
+        self.per_token = per_token
+        self._in_flight = 0
+        self._running: Dict[str, int] = {}
+        self._last_tag: Dict[str, float] = {}
+        self._virtual_time = 0.0
+        self._waiters: List = []
+        self._seq = itertools.count()
+        self.admitted = 0
+        self.queued = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _can_run(self, token: str) -> bool:
+        return self._in_flight < self.capacity and self._running.get(token, 0) < self.per_token
+
+    def _dispatch(self) -> None:
+        blocked = []
+        while self._waiters and self._in_flight < self.capacity:
+            entry = heapq.heappop(self._waiters)
+            _, _, start_tag, token, future = entry
+            if future.done():
+                continue
+            if not self._can_run(token):
+                blocked.append(entry)
+                continue
+            self._in_flight += 1
+            self._running[token] = self._running.get(token, 0) + 1
+            self._virtual_time = max(self._virtual_time, start_tag)
+            future.set_result(None)
+        for entry in blocked:
+            heapq.heappush(self._waiters, entry)
+
+    def _release(self, token: str) -> None:
+        self._in_flight -= 1
+        self._running[token] -= 1
+        if not self._running[token]:
+            del self._running[token]
+            if not any(entry[3] == token for entry in self._waiters):
+                self._last_tag.pop(token, None)
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, token: str, cost: float = 1.0):
+        """Hold one of the scheduler's slots for ``token`` while the block runs."""
+        start_tag = max(self._virtual_time, self._last_tag.get(token, 0.0))
+        finish_tag = start_tag + cost
+        self._last_tag[token] = finish_tag
+        future = asyncio.get_running_loop().create_future()
+        entry = (finish_tag, next(self._seq), start_tag, token, future)
+        heapq.heappush(self._waiters, entry)
+        self._dispatch()
+
+        if not future.done():
+            self.queued += 1
+        started = time.monotonic()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Admitted just as it was cancelled: hand the slot on
+                self._release(token)
+            else:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                if token not in self._running and not any(waiter[3] == token for waiter in self._waiters):
+                    self._last_tag.pop(token, None)
+            raise
+        waited = time.monotonic() - started
+        self.admitted += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        try:
+            yield
+        finally:
+            self._release(token)
+
+    def metrics(self) -> Dict:
+        waiting: Dict[str, int] = {}
+        for entry in self._waiters:
+            if not entry[4].done():
+                label = token_label(entry[3])
+                waiting[label] = waiting.get(label, 0) + 1
+        return {
+            "capacity": self.capacity,
+            "per_token": self.per_token,
+            "in_flight": self._in_flight,
+            "waiting": sum(waiting.values()),
+            "admitted_total": self.admitted,
+            "queued_total": self.queued,
+            "avg_wait_ms": round(self.total_wait / self.admitted * 1000, 2) if self.admitted else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 2),
+            "tokens": {
+                label: {"in_flight": self._running.get(token, 0), "waiting": waiting.get(label, 0)}
+                for token in set(self._running) | {entry[3] for entry in self._waiters if not entry[4].done()}
+                for label in [token_label(token)]
+            },
+        }
+
+
+upstream_admission = FairScheduler("upstream", UPSTREAM_CONCURRENCY, UPSTREAM_PER_TOKEN)
+analysis_admission = FairScheduler("analysis", ANALYSIS_CONCURRENCY, ANALYSIS_PER_TOKEN)
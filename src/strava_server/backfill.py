@@ -0,0 +1,174 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+from dotenv import load_dotenv
+
+from .ratelimit import RateBudget
+from .store import activity_store
+from .utils import ACTIVITY_STREAM_KEYS, make_strava_request, resolve_token
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 200
+# Strava's default application limit is 100 requests per 15 minutes
+BACKFILL_RATE = float(os.getenv("STRAVA_BACKFILL_RATE", "90"))
+BACKFILL_PERIOD = 15 * 60
+
+
+class Backfill:
+    """Walks an athlete's full activity history into a local directory.
+
+    Pages are requested newest to oldest with a ``before`` cursor. Every page is
+    appended to ``activities.jsonl`` and the cursor is saved to
+    ``checkpoint.json``, so an interrupted run resumes at the next page.
+    Details and streams are saved one file per activity and skipped when the
+    file already exists.
+
+    Layout of ``data_dir``::
+
+        checkpoint.json
+        activities.jsonl
+        details/<activity_id>.json
+        streams/<activity_id>.json
+    """
+
+    def __init__(self, data_dir: str, token: str = None, details: bool = False, streams: bool = False,
+                 budget: RateBudget = None) -> None:
+        self.data_dir = Path(data_dir)
+        self.token = resolve_token(token)
+        self.details = details
+        self.streams = streams
+        self.budget = budget or RateBudget(BACKFILL_RATE, per=BACKFILL_PERIOD)
+        self.checkpoint_path = self.data_dir / "checkpoint.json"
+        self.activities_path = self.data_dir / "activities.jsonl"
+
+    def load_checkpoint(self) -> Dict:
+        if self.checkpoint_path.exists():
+            return json.loads(self.checkpoint_path.read_text())
+        return {"before": None, "pages": 0, "activities": 0, "complete": False}
+
+    def save_checkpoint(self, checkpoint: Dict) -> None:
+        # Write then rename so a crash never leaves a truncated checkpoint
+        tmp = self.checkpoint_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(checkpoint))
+        tmp.replace(self.checkpoint_path)
+
+    async def _get(self, endpoint: str, params: dict = None):
+        await self.budget.acquire()
+        response = await make_strava_request("GET", endpoint, self.token, params=params)
+        return response.json()
+
+    async def _save_once(self, folder: str, activity_id: int, endpoint: str, params: dict = None) -> None:
+        path = self.data_dir / folder / f"{activity_id}.json"
+        if path.exists():
+            return
+        body = await self._get(endpoint, params)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(body))
+        tmp.replace(path)
+
+    async def run(self) -> Dict:
+        """Fetch every remaining page and return the final checkpoint."""
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        checkpoint = self.load_checkpoint()
+        while not checkpoint["complete"]:
+            params = {"per_page": PAGE_SIZE}
+            if checkpoint["before"] is not None:
+                params["before"] = checkpoint["before"]
+            page = await self._get("/athlete/activities", params)
+            if not page:
+                checkpoint["complete"] = True
+                self.save_checkpoint(checkpoint)
+                break
+
+            with self.activities_path.open("a") as f:
+                for activity in page:
+                    f.write(json.dumps(activity) + "\n")
+            activity_store.ingest(self.token, page)
+
+            for activity in page:
+                if self.details:
+                    await self._save_once("details", activity["id"], f"/activities/{activity['id']}")
+                if self.streams:
+                    await self._save_once("streams", activity["id"], f"/activities/{activity['id']}/streams",
+                                          {"keys": ",".join(ACTIVITY_STREAM_KEYS), "key_by_type": "true"})
+
+            oldest = min(datetime.strptime(a["start_date"], "%Y-%m-%dT%H:%M:%SZ") for a in page)
+            checkpoint["before"] = int((oldest - datetime(1970, 1, 1)).total_seconds())
+            checkpoint["pages"] += 1
+            checkpoint["activities"] += len(page)
+            self.save_checkpoint(checkpoint)
+            logger.info("Backfilled page %s (%s activities so far)", checkpoint["pages"], checkpoint["activities"])
+        return checkpoint
+
+
+def read_activities(data_dir: str) -> Iterator[dict]:
+    """Backfilled activity summaries, each activity once, in file order."""
+    path = Path(data_dir) / "activities.jsonl"
+    if not path.exists():
+        return
+    seen = set()
+    with path.open() as f:
+        for line in f:
+            if not line.strip():
+                continue
+            activity = json.loads(line)
+            if activity["id"] not in seen:
+                seen.add(activity["id"])
+                yield activity
+
+
+def load_into_store(data_dir: str, token: Optional[str] = None) -> int:
+    """Populate the activity store from a backfill directory."""
+    count = 0
+    for activity in read_activities(data_dir):
+        athlete_id = activity.get("athlete", {}).get("id")
+        if athlete_id is None:
+            continue
+        activity_store.upsert(athlete_id, activity)
+        if token:
+            activity_store.remember_token(athlete_id, token)
+        count += 1
+    return count
+
+
+async def run_backfill_task() -> None:
+    """Lifespan task: load and continue the backfill in STRAVA_BACKFILL_DIR, if set."""
+    data_dir = os.getenv("STRAVA_BACKFILL_DIR")
+    token = os.getenv("STRAVA_ACCESS_TOKEN")
+    if not data_dir or not token:
+        return
+    load_into_store(data_dir, token)
+    try:
+        await Backfill(data_dir, token).run()
+    except Exception as exc:
+        logger.warning("Backfill stopped: %s", exc)
+
+
+def main() -> None:
+    """Command line entry point."""
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Download an athlete's full Strava activity history.")
+    parser.add_argument("data_dir", help="Directory for activities, details, streams and the checkpoint")
+    parser.add_argument("--token", help="Access token (defaults to STRAVA_ACCESS_TOKEN)")
+    parser.add_argument("--details", action="store_true", help="Also download each activity's details")
+    parser.add_argument("--streams", action="store_true", help="Also download each activity's streams")
+    parser.add_argument("--rate", type=float, default=BACKFILL_RATE, help="Requests allowed per 15 minutes")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    backfill = Backfill(args.data_dir, args.token, details=args.details, streams=args.streams,
+                        budget=RateBudget(args.rate, per=BACKFILL_PERIOD))
+    checkpoint = asyncio.run(backfill.run())
+    print(f"Backfill complete: {checkpoint['activities']} activities in {checkpoint['pages']} pages")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+DEFAULT_TTL = float(os.getenv("STRAVA_CACHE_TTL", "300"))
+MAX_ENTRIES = int(os.getenv("STRAVA_CACHE_MAX_ENTRIES", "2048"))
+# Activity details and streams only change on edits; with a webhook subscription
+# those edits invalidate the cache, so the entries can live much longer.
+ACTIVITY_TTL = float(os.getenv(
+    "STRAVA_ACTIVITY_CACHE_TTL",
+    "86400" if os.getenv("STRAVA_WEBHOOK_VERIFY_TOKEN") else str(DEFAULT_TTL),
+))
+# Expired entries are kept this long to be served while Strava is failing or being revalidated
+STALE_TTL = float(os.getenv("STRAVA_CACHE_STALE_TTL", "86400"))
+# Club feeds change whenever any member uploads, so aggregates are kept briefly
+CLUB_TTL = float(os.getenv("STRAVA_CLUB_CACHE_TTL", "120"))
+# Segments in an area rarely change, so explore tiles are kept for a week
+EXPLORE_TTL = float(os.getenv("STRAVA_EXPLORE_CACHE_TTL", str(7 * 86400)))
+
+
+class ResponseCache:
+    """In-memory LRU cache of decoded Strava responses.
+
+    Entries are keyed by (endpoint, token, params) so that one athlete's data is
+    never served to another token. Expired entries stay available through
+    ``get_stale`` for ``stale_ttl`` seconds.
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, stale_ttl: float = STALE_TTL) -> None:
+        self.max_entries = max_entries
+        self.stale_ttl = stale_ttl
+        self._entries: "OrderedDict[Tuple, Tuple[float, float, Any]]" = OrderedDict()
+
+    @staticmethod
+    def make_key(endpoint: str, token: str, params: Optional[dict] = None) -> Tuple:
+        items = tuple(sorted((k, str(v)) for k, v in (params or {}).items()))
+        return (endpoint, token, items)
+
+    def get(self, key: Tuple) -> Optional[Any]:
+        """The cached value if it is still fresh."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, _, value = entry
+        if expires_at < time.monotonic():
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def get_stale(self, key: Tuple) -> Optional[Tuple[Any, float]]:
+        """The cached value and its age in seconds, even if expired, within the stale window."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, stored_at, value = entry
+        now = time.monotonic()
+        if expires_at + self.stale_ttl < now:
+            del self._entries[key]
+            return None
+        return value, now - stored_at
+
+    def set(self, key: Tuple, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = DEFAULT_TTL if ttl is None else ttl
+        now = time.monotonic()
+        self._entries[key] = (now + ttl, now, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, endpoint: Optional[str] = None, token: Optional[str] = None) -> int:
+        """Drop entries for an endpoint (and its sub-paths) and/or a token."""
+        removed = 0
+        for key in list(self._entries):
+            key_endpoint, key_token, _ = key
+            if endpoint is not None and key_endpoint != endpoint and not key_endpoint.startswith(endpoint + "/"):
+                continue
+            if token is not None and key_token != token:
+                continue
+            del self._entries[key]
+            removed += 1
+        return removed
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,58 @@
+from typing import Dict, List
+
+
+def _athlete_name(athlete: dict) -> str:
+    return " ".join(filter(None, [athlete.get("firstname"), athlete.get("lastname")]))
+
+
+def dedup_members(members: List[dict]) -> List[dict]:
+    """Club members once each; Strava returns no member ids, so names are the key."""
+    seen = set()
+    unique = []
+    for member in members:
+        key = (member.get("firstname"), member.get("lastname"))
+        if key not in seen:
+            seen.add(key)
+            unique.append(member)
+    return unique
+
+
+def dedup_activities(activities: List[dict]) -> List[dict]:
+    """Club feed entries once each; pages shift while the feed updates, so the
+    same activity can appear on two pages."""
+    seen = set()
+    unique = []
+    for activity in activities:
+        key = (_athlete_name(activity.get("athlete") or {}), activity.get("name"), activity.get("type"),
+               activity.get("distance"), activity.get("moving_time"), activity.get("elapsed_time"))
+        if key not in seen:
+            seen.add(key)
+            unique.append(activity)
+    return unique
+
+
+def club_totals(activities: List[dict]) -> Dict:
+    """Totals and a distance leaderboard over club feed activities."""
+    athletes: Dict[str, Dict] = {}
+    by_type: Dict[str, Dict] = {}
+    for activity in activities:
+        name = _athlete_name(activity.get("athlete") or {})
+        for bucket in (athletes.setdefault(name, {"athlete": name}),
+                       by_type.setdefault(activity.get("sport_type") or activity.get("type", "Unknown"), {})):
+            bucket["activities"] = bucket.get("activities", 0) + 1
+            bucket["distance_km"] = bucket.get("distance_km", 0) + activity.get("distance", 0) / 1000
+            bucket["moving_time_h"] = bucket.get("moving_time_h", 0) + activity.get("moving_time", 0) / 3600
+            bucket["elevation_m"] = bucket.get("elevation_m", 0) + activity.get("total_elevation_gain", 0)
+
+    def rounded(bucket):
+        return {k: round(v, 1) if isinstance(v, float) else v for k, v in bucket.items()}
+
+    leaderboard = sorted(athletes.values(), key=lambda b: b["distance_km"], reverse=True)
+    return {
+        "activities": len(activities),
+        "athletes": len(athletes),
+        "distance_km": round(sum(a.get("distance", 0) for a in activities) / 1000, 1),
+        "moving_time_h": round(sum(a.get("moving_time", 0) for a in activities) / 3600, 1),
+        "by_type": {sport: rounded(bucket) for sport, bucket in by_type.items()},
+        "leaderboard": [rounded(bucket) for bucket in leaderboard],
+    }
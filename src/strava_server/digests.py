@@ -0,0 +1,181 @@
+import math
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from .records import ActivityRecord, utc_timestamp
+from .store import activity_store
+
+PERIODS = ("daily", "weekly", "monthly")
+TOP_TYPES = 3
+NOTABLE = 3
+# Pace and speed bests only consider activities at least this long
+MIN_BEST_DISTANCE = 1000
+# Seconds a fetched period window counts as synced before it is fetched again
+SYNC_TTL = float(os.getenv("STRAVA_DIGEST_SYNC_TTL", "3600"))
+
+
+def period_start(period: str, moment: datetime) -> datetime:
+    """Start (UTC midnight) of the day, ISO week or month containing ``moment``."""
+    day = datetime(moment.year, moment.month, moment.day)
+    if period == "daily":
+        return day
+    if period == "weekly":
+        return day - timedelta(days=day.weekday())
+    return datetime(moment.year, moment.month, 1)
+
+
+def next_period_start(period: str, start: datetime) -> datetime:
+    if period == "daily":
+        return start + timedelta(days=1)
+    if period == "weekly":
+        return start + timedelta(weeks=1)
+    return datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+
+
+def period_label(period: str, start: datetime) -> str:
+    if period == "daily":
+        return start.strftime("%Y-%m-%d")
+    if period == "weekly":
+        year, week, _ = start.isocalendar()
+        return f"{year}-W{week:02d}"
+    return start.strftime("%Y-%m")
+
+
+def _brief(record: ActivityRecord, **values) -> Dict:
+    return {"id": record.id, "name": record.name, "type": record.type, "start_date": record.start_date, **values}
+
+
+def build_digest(records: List[ActivityRecord]) -> Dict:
+    """Fixed-size summary of a period's activities: totals, top types, bests, load and notable activities."""
+    by_type: Dict[str, List[float]] = {}
+    for r in records:
+        counts = by_type.setdefault(r.type, [0, 0.0])
+        counts[0] += 1
+        counts[1] += r.distance
+    top_types = sorted(by_type.items(), key=lambda item: (item[1][0], item[1][1]), reverse=True)[:TOP_TYPES]
+
+    bests = {}
+    if records:
+        longest = max(records, key=lambda r: r.distance)
+        climb = max(records, key=lambda r: r.total_elevation_gain)
+        bests["longest"] = _brief(longest, distance_km=round(longest.distance / 1000, 2))
+        bests["most_elevation"] = _brief(climb, elevation_m=round(climb.total_elevation_gain))
+        timed = [r for r in records if r.distance >= MIN_BEST_DISTANCE and r.moving_time]
+        if timed:
+            fastest = max(timed, key=lambda r: r.distance / r.moving_time)
+            bests["fastest"] = _brief(fastest, speed_kmh=round(fastest.distance / fastest.moving_time * 3.6, 1))
+
+    efforts = [r.suffer_score for r in records if r.suffer_score is not None]
+    notable = sorted(records, key=lambda r: (r.suffer_score or 0, r.moving_time), reverse=True)[:NOTABLE]
+    return {
+        "totals": {
+            "activities": len(records),
+            "distance_km": round(sum(r.distance for r in records) / 1000, 2),
+            "moving_time_h": round(sum(r.moving_time for r in records) / 3600, 2),
+            "elevation_m": round(sum(r.total_elevation_gain for r in records)),
+            "kilojoules": round(sum(r.kilojoules or 0 for r in records)),
+        },
+        "by_type": {t: {"activities": n, "distance_km": round(d / 1000, 2)} for t, (n, d) in top_types},
+        "bests": bests,
+        "load": {
+            "relative_effort": round(sum(efforts)) if efforts else None,
+            "active_days": len({r.start // 86400 for r in records}),
+        },
+        "notable": [_brief(r, distance_km=round(r.distance / 1000, 2), moving_time_min=round(r.moving_time / 60),
+                           relative_effort=r.suffer_score) for r in notable],
+    }
+
+
+class DigestIndex:
+    """Daily, weekly and monthly digests per athlete, maintained from activity store changes.
+
+    Each stored activity belongs to one period of each kind. When an activity
+    is upserted or removed, only the digests of its periods are rebuilt, so a
+    digest request is a dictionary lookup. Periods whose activities were
+    fetched in full are marked as synced for SYNC_TTL seconds.
+    """
+
+    def __init__(self, sync_ttl: float = SYNC_TTL) -> None:
+        self.sync_ttl = sync_ttl
+        self._synced: Dict[Tuple[int, str, str], float] = {}
+        self._members: Dict[Tuple[int, str, str], Dict[int, ActivityRecord]] = {}
+        self._digests: Dict[Tuple[int, str, str], Dict] = {}
+        self._activity_periods: Dict[int, List[Tuple[int, str, str]]] = {}
+
+    def on_store_change(self, event: str, athlete_id: int, payload) -> None:
+        if event == "upsert":
+            self._discard(payload.id)
+            moment = datetime.utcfromtimestamp(payload.start)
+            keys = [(athlete_id, period, period_label(period, period_start(period, moment))) for period in PERIODS]
+            for key in keys:
+                self._members.setdefault(key, {})[payload.id] = payload
+                self._rebuild(key)
+            self._activity_periods[payload.id] = keys
+        elif event == "remove":
+            self._discard(payload)
+        elif event == "forget":
+            for key in [k for k in self._members if k[0] == athlete_id]:
+                for activity_id in self._members.pop(key):
+                    self._activity_periods.pop(activity_id, None)
+                self._digests.pop(key, None)
+            for key in [k for k in self._synced if k[0] == athlete_id]:
+                del self._synced[key]
+
+    def _discard(self, activity_id: int) -> None:
+        for key in self._activity_periods.pop(activity_id, ()):
+            members = self._members.get(key, {})
+            members.pop(activity_id, None)
+            if members:
+                self._rebuild(key)
+            else:
+                self._members.pop(key, None)
+                self._digests.pop(key, None)
+
+    def _rebuild(self, key: Tuple[int, str, str]) -> None:
+        self._digests[key] = build_digest(list(self._members[key].values()))
+
+    def _window(self, athlete_id: int, period: str, start: datetime) -> List[Tuple[int, str, str]]:
+        previous_start = period_start(period, start - timedelta(days=1))
+        return [(athlete_id, period, period_label(period, s)) for s in (start, previous_start)]
+
+    def covers(self, athlete_id: int, period: str, start: datetime) -> bool:
+        """Whether the period starting at ``start`` and the one before it were synced within SYNC_TTL."""
+        now = time.monotonic()
+        return all(now - self._synced.get(key, -math.inf) < self.sync_ttl
+                   for key in self._window(athlete_id, period, start))
+
+    def mark_synced(self, athlete_id: int, period: str, start: datetime) -> None:
+        """Record that all activities of the period starting at ``start`` and the one before it were fetched."""
+        now = time.monotonic()
+        for key in self._window(athlete_id, period, start):
+            self._synced[key] = now
+
+    def digest(self, athlete_id: int, period: str, start: datetime) -> Dict:
+        """Digest of the period starting at ``start``, with changes against the previous period."""
+        label = period_label(period, start)
+        digest = self._digests.get((athlete_id, period, label)) or build_digest([])
+        previous_start = period_start(period, start - timedelta(days=1))
+        previous = self._digests.get((athlete_id, period, period_label(period, previous_start))) or build_digest([])
+        return {
+            "period": period,
+            "label": label,
+            "start": utc_timestamp(start),
+            "end": utc_timestamp(next_period_start(period, start)),
+            **digest,
+            "vs_previous": {
+                name: _change(digest["totals"][name], previous["totals"][name])
+                for name in ("activities", "distance_km", "moving_time_h")
+            },
+        }
+
+
+def _change(current: float, previous: float) -> Optional[str]:
+    if not previous:
+        return None
+    return f"{(current - previous) / previous * 100:+.0f}%"
+
+
+digest_index = DigestIndex()
+activity_store.subscribe(digest_index.on_store_change)
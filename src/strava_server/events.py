@@ -0,0 +1,76 @@
+import asyncio
+import logging
+import os
+
+from .cache import response_cache
+from .store import activity_store
+from .utils import make_strava_request
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_VERIFY_TOKEN = os.getenv("STRAVA_WEBHOOK_VERIFY_TOKEN")
+WEBHOOK_SUBSCRIPTION_ID = os.getenv("STRAVA_WEBHOOK_SUBSCRIPTION_ID")
+
+webhook_queue: asyncio.Queue = asyncio.Queue()
+
+# Webhook update keys that differ from the activity field they change
+UPDATE_FIELDS = {"title": "name"}
+
+
+def activity_updates(updates: dict) -> dict:
+    """Translate the ``updates`` of an activity event into activity fields.
+
+    Strava sends ``title`` for the name and booleans as strings.
+    """
+    fields = {}
+    for key, value in updates.items():
+        if value in ("true", "false"):
+            value = value == "true"
+        fields[UPDATE_FIELDS.get(key, key)] = value
+    return fields
+
+
+async def handle_event(event: dict) -> None:
+    """Apply one Strava push event to the response cache and the activity store.
+
+    See https://developers.strava.com/docs/webhooks/ for the event format.
+    """
+    object_type = event.get("object_type")
+    aspect_type = event.get("aspect_type")
+    object_id = event.get("object_id")
+    owner_id = event.get("owner_id")
+    updates = event.get("updates") or {}
+    token = activity_store.token_for(owner_id)
+
+    if object_type == "athlete":
+        if str(updates.get("authorized", "")).lower() == "false":
+            token = activity_store.forget_athlete(owner_id)
+            if token is not None:
+                response_cache.invalidate(token=token)
+        return
+
+    if object_type != "activity":
+        return
+
+    response_cache.invalidate(f"/activities/{object_id}")
+    if token is not None:
+        response_cache.invalidate("/athlete/activities", token=token)
+
+    if aspect_type == "delete":
+        activity_store.remove(owner_id, object_id)
+    elif token is not None:
+        response = await make_strava_request("GET", f"/activities/{object_id}", token)
+        activity_store.upsert(owner_id, response.json())
+    elif aspect_type == "update":
+        activity_store.update_fields(owner_id, object_id, activity_updates(updates))
+
+
+async def run_event_consumer() -> None:
+    while True:
+        event = await webhook_queue.get()
+        try:
+            await handle_event(event)
+        except Exception as exc:
+            logger.warning("Failed to handle webhook event %s: %s", event, exc)
+        finally:
+            webhook_queue.task_done()
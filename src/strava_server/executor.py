@@ -0,0 +1,136 @@
+"""
+Offloading of CPU-bound stream analysis from the event loop.
+
+``STRAVA_ANALYSIS_EXECUTOR`` selects where ``run_stream_task`` runs work:
+
+* ``process`` (default) - a process pool; numeric streams are copied once into a
+  shared memory block instead of being pickled sample by sample
+* ``thread`` - a thread pool, for analysis code that releases the GIL
+* ``inline`` - on the event loop, as before
+
+Small inputs always run inline, where dispatch would cost more than the work.
+"""
+import asyncio
+import functools
+import math
+import os
+from array import array
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from .admission import ANALYSIS_CONCURRENCY
+
+EXECUTOR_KIND = os.getenv("STRAVA_ANALYSIS_EXECUTOR", "process")
+# Inputs with fewer samples than this (about 5.5 hours at 1 Hz) run inline
+OFFLOAD_MIN_SAMPLES = int(os.getenv("STRAVA_OFFLOAD_MIN_SAMPLES", "20000"))
+
+Streams = Dict[str, dict]
+# (activity index, stream key, offset, length, kind)
+Layout = List[Tuple[int, str, int, int, str]]
+
+_executor: Optional[Executor] = None
+
+
+def get_executor() -> Optional[Executor]:
+    global _executor
+    if _executor is None and EXECUTOR_KIND != "inline":
+        if EXECUTOR_KIND == "thread":
+            _executor = ThreadPoolExecutor(max_workers=ANALYSIS_CONCURRENCY, thread_name_prefix="analysis")
+        else:
+            _executor = ProcessPoolExecutor(max_workers=ANALYSIS_CONCURRENCY)
+    return _executor
+
+
+def shutdown_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _sample_count(all_streams: List[Streams]) -> int:
+    return sum(
+        max((len(s.get("data") or []) for s in streams.values() if isinstance(s, dict)), default=0)
+        for streams in all_streams
+    )
+
+
+def pack_streams(all_streams: List[Streams]) -> Tuple[shared_memory.SharedMemory, Layout]:
+    """Copy every stream of every activity into one block of float64 values.
+
+    Missing samples (``None``, e.g. heart rate dropouts) are stored as NaN.
+    """
+    nan = math.nan
+    layout: Layout = []
+    values = array("d")
+    for index, streams in enumerate(all_streams):
+        for key, stream in streams.items():
+            data = stream.get("data") if isinstance(stream, dict) else None
+            if not data:
+                continue
+            first = next((v for v in data if v is not None), None)
+            if isinstance(first, (list, tuple)):
+                kind = "pair"
+                flat = [c for point in data for c in (point if point is not None else (nan, nan))]
+            else:
+                kind = "bool" if isinstance(first, bool) else "float"
+                flat = [nan if v is None else v for v in data]
+            layout.append((index, key, len(values), len(flat), kind))
+            values.extend(flat)
+    size = len(values) * values.itemsize
+    block = shared_memory.SharedMemory(create=True, size=max(1, size))
+    block.buf[:size] = memoryview(values).cast("B")
+    return block, layout
+
+
+def unpack_streams(buffer, layout: Layout, count: int) -> List[Streams]:
+    """Rebuild key_by_type stream dicts from a packed block, NaN back to ``None``."""
+    doubles = buffer.cast("d")
+    all_streams: List[Streams] = [{} for _ in range(count)]
+    try:
+        for index, key, offset, length, kind in layout:
+            data = [None if v != v else v for v in doubles[offset:offset + length].tolist()]
+            if kind == "pair":
+                data = [None if data[i] is None else [data[i], data[i + 1]] for i in range(0, length, 2)]
+            elif kind == "bool":
+                data = [None if v is None else bool(v) for v in data]
+            all_streams[index][key] = {"data": data}
+    finally:
+        doubles.release()
+    return all_streams
+
+
+def _run_packed(func: Callable, name: str, layout: Layout, count: int, single: bool, args: tuple):
+    """Worker entry point: attach to the shared block, rebuild the streams and run ``func``."""
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        all_streams = unpack_streams(block.buf, layout, count)
+    finally:
+        block.close()
+    return func(all_streams[0] if single else all_streams, *args)
+
+
+async def run_stream_task(func: Callable, streams: Union[Streams, List[Streams]], *args):
+    """Run ``func(streams, *args)`` off the event loop.
+
+    ``streams`` is one key_by_type streams dict or a list of them; ``func``
+    must be a module-level function so the process pool can import it.
+    """
+    single = isinstance(streams, dict)
+    all_streams = [streams] if single else streams
+    executor = get_executor()
+    if executor is None or _sample_count(all_streams) < OFFLOAD_MIN_SAMPLES:
+        return func(streams, *args)
+
+    loop = asyncio.get_running_loop()
+    if isinstance(executor, ThreadPoolExecutor):
+        return await loop.run_in_executor(executor, functools.partial(func, streams, *args))
+
+    block, layout = pack_streams(all_streams)
+    try:
+        return await loop.run_in_executor(
+            executor, _run_packed, func, block.name, layout, len(all_streams), single, args)
+    finally:
+        block.close()
+        block.unlink()
@@ -0,0 +1,94 @@
+import asyncio
+import math
+import os
+from typing import Dict, List, Tuple
+
+from .cache import EXPLORE_TTL, response_cache
+from .ratelimit import RateBudget
+from .resilience import breaker_for, mark_stale
+from .utils import refresh_cached, resolve_token, revalidate_cached
+
+# Tiles are aligned to a global grid so that overlapping areas share cached tiles
+TILE_DEGREES = float(os.getenv("STRAVA_EXPLORE_TILE_DEGREES", "0.05"))
+MAX_TILES = 64
+# Upstream explore calls per minute across all tiled queries
+EXPLORE_RATE = float(os.getenv("STRAVA_EXPLORE_RATE", "30"))
+# Strava returns at most this many segments per explore call
+EXPLORE_LIMIT = 10
+# Explore results do not depend on the athlete, so tiles are cached under this token for everyone
+SHARED_TOKEN = "*"
+
+explore_budget = RateBudget(EXPLORE_RATE)
+
+
+def tile_grid(bounds: List[float], size: float = TILE_DEGREES) -> List[Tuple[float, float, float, float]]:
+    """Grid tiles (sw_lat, sw_lng, ne_lat, ne_lng) covering ``bounds``, in the same order."""
+    sw_lat, sw_lng, ne_lat, ne_lng = bounds
+    # Rounding keeps edges that sit on a grid line from spilling into the next tile
+    rows = range(math.floor(round(sw_lat / size, 9)), math.ceil(round(ne_lat / size, 9)))
+    cols = range(math.floor(round(sw_lng / size, 9)), math.ceil(round(ne_lng / size, 9)))
+    return [(round(r * size, 6), round(c * size, 6), round((r + 1) * size, 6), round((c + 1) * size, 6))
+            for r in rows for c in cols]
+
+
+def _inside(point: List[float], bounds: List[float]) -> bool:
+    return bool(point) and bounds[0] <= point[0] <= bounds[2] and bounds[1] <= point[1] <= bounds[3]
+
+
+async def explore_tiled(token: str, bounds: List[float], params: Dict) -> Dict:
+    """Explore an area tile by tile and merge the results.
+
+    Tiles are cached per bounds and filters, shared by all tokens. Fresh
+    tiles are answered from the cache. Every upstream call, whether for a
+    missing tile or to revalidate an expired one in the background, takes
+    from ``explore_budget``; missing tiles over budget are reported as
+    pending and will be filled in by a later call, expired ones are served
+    as they are.
+    """
+    token = resolve_token(token)
+    tiles = tile_grid(bounds)
+    if len(tiles) > MAX_TILES:
+        raise ValueError(f"Area covers {len(tiles)} tiles; at most {MAX_TILES} are allowed")
+
+    # One entry per tile: a cached body, or the index of its upstream call in ``fetched``
+    answered, fetched, pending = [], [], []
+    for tile in tiles:
+        tile_params = {**params, "bounds": ",".join(map(str, tile))}
+        key = response_cache.make_key("/segments/explore", SHARED_TOKEN, tile_params)
+        fresh = response_cache.get(key)
+        if fresh is not None:
+            answered.append(fresh)
+            continue
+        stale = response_cache.get_stale(key)
+        if stale is not None:
+            body, age = stale
+            if breaker_for("/segments/explore").state != "open" and explore_budget.try_acquire():
+                revalidate_cached(key, "/segments/explore", token, tile_params, EXPLORE_TTL)
+            mark_stale(age)
+            answered.append(body)
+        elif explore_budget.try_acquire():
+            answered.append(len(fetched))
+            fetched.append(refresh_cached(key, "/segments/explore", token, tile_params, EXPLORE_TTL))
+        else:
+            pending.append(tile)
+    bodies = await asyncio.gather(*fetched)
+    results = [bodies[entry] if isinstance(entry, int) else entry for entry in answered]
+
+    segments, seen = [], set()
+    saturated = 0
+    for result in results:
+        tile_segments = result.get("segments") or []
+        saturated += len(tile_segments) >= EXPLORE_LIMIT
+        for segment in tile_segments:
+            if segment.get("id") in seen or not _inside(segment.get("start_latlng"), bounds):
+                continue
+            seen.add(segment.get("id"))
+            segments.append(segment)
+    return {
+        "bounds": bounds,
+        "tiles": len(tiles),
+        "pending_tiles": len(pending),
+        # Tiles holding Strava's per-call maximum may have more segments than were returned
+        "saturated_tiles": saturated,
+        "segments": segments,
+    }
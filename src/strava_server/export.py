@@ -0,0 +1,243 @@
+import argparse
+import asyncio
+import csv
+import io
+import json
+import os
+from pathlib import Path
+from typing import AsyncIterator, Iterable, List, Optional
+
+from dotenv import load_dotenv
+
+from .backfill import BACKFILL_PERIOD, read_activities
+from .ratelimit import RateBudget
+from .utils import ACTIVITY_STREAM_KEYS, make_strava_request, resolve_token
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet/Arrow export needs the optional pyarrow package
+    pa = None
+
+FORMATS = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet",
+           "arrow": "application/vnd.apache.arrow.stream"}
+BATCH_SIZE = 200
+# Stream requests per 15 minutes shared by all stream exports
+EXPORT_STREAMS_RATE = float(os.getenv("STRAVA_EXPORT_STREAMS_RATE", "90"))
+
+export_budget = RateBudget(EXPORT_STREAMS_RATE, per=BACKFILL_PERIOD)
+
+# Column name -> type; nested summary fields are flattened by activity_row
+ACTIVITY_COLUMNS = {
+    "id": "int", "athlete_id": "int", "name": "str", "type": "str", "sport_type": "str",
+    "start_date": "str", "start_date_local": "str", "timezone": "str",
+    "distance": "float", "moving_time": "int", "elapsed_time": "int", "total_elevation_gain": "float",
+    "average_speed": "float", "max_speed": "float", "average_heartrate": "float", "max_heartrate": "float",
+    "average_watts": "float", "weighted_average_watts": "float", "kilojoules": "float",
+    "average_cadence": "float", "suffer_score": "float", "gear_id": "str",
+    "trainer": "bool", "commute": "bool", "manual": "bool", "private": "bool", "kudos_count": "int",
+}
+STREAM_COLUMNS = {
+    "activity_id": "int", "time": "int", "distance": "float", "lat": "float", "lng": "float",
+    "altitude": "float", "velocity_smooth": "float", "heartrate": "float", "cadence": "float",
+    "watts": "float", "temp": "float", "moving": "bool", "grade_smooth": "float",
+}
+
+
+def activity_row(activity: dict) -> list:
+    row = dict(activity, athlete_id=(activity.get("athlete") or {}).get("id"))
+    return [row.get(column) for column in ACTIVITY_COLUMNS]
+
+
+def stream_rows(activity_id: int, streams: dict) -> Iterable[list]:
+    """One row per sample, latlng split into lat and lng."""
+    data = {key: stream.get("data") or [] for key, stream in streams.items()}
+    latlng = data.pop("latlng", None)
+    if latlng:
+        data["lat"] = [point[0] for point in latlng]
+        data["lng"] = [point[1] for point in latlng]
+    length = max((len(values) for values in data.values()), default=0)
+    for i in range(length):
+        yield [activity_id] + [
+            data[column][i] if column in data and i < len(data[column]) else None
+            for column in list(STREAM_COLUMNS)[1:]
+        ]
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands back what was written since the last drain."""
+
+    def __init__(self) -> None:
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class ExportWriter:
+    """Incrementally encodes row batches as CSV, Parquet or an Arrow IPC stream.
+
+    ``write`` and ``close`` return the encoded bytes produced so far, so rows
+    can be streamed to a file or HTTP response without being held in memory.
+    """
+
+    def __init__(self, columns: dict, fmt: str = "csv") -> None:
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported export format '{fmt}'. Use one of {list(FORMATS)}")
+        if fmt != "csv" and pa is None:
+            raise ValueError(f"Export format '{fmt}' requires pyarrow to be installed")
+        self.columns = columns
+        self.fmt = fmt
+        self._sink = _ChunkSink()
+        if fmt == "csv":
+            self._text = io.StringIO()
+            self._csv = csv.writer(self._text)
+            self._csv.writerow(list(columns))
+        else:
+            types = {"int": pa.int64(), "float": pa.float64(), "str": pa.string(), "bool": pa.bool_()}
+            self._schema = pa.schema([(name, types[kind]) for name, kind in columns.items()])
+            if fmt == "parquet":
+                self._writer = pq.ParquetWriter(self._sink, self._schema, compression="zstd")
+            else:
+                self._writer = pa.ipc.new_stream(self._sink, self._schema)
+
+    def _drain_text(self) -> bytes:
+        data = self._text.getvalue().encode()
+        self._text.seek(0)
+        self._text.truncate()
+        return data
+
+    def write(self, rows: List[list]) -> bytes:
+        if self.fmt == "csv":
+            self._csv.writerows(rows)
+            return self._drain_text()
+        if rows:
+            columns = list(zip(*rows))
+            batch = pa.record_batch([pa.array(values, type=field.type)
+                                     for values, field in zip(columns, self._schema)], schema=self._schema)
+            self._writer.write_batch(batch)
+        return self._sink.drain()
+
+    def close(self) -> bytes:
+        if self.fmt == "csv":
+            return self._drain_text()
+        self._writer.close()
+        return self._sink.drain()
+
+
+async def fetch_activity_pages(token: str, after: Optional[int] = None,
+                               before: Optional[int] = None) -> AsyncIterator[List[dict]]:
+    """Every activity summary from Strava, one page at a time."""
+    page = 1
+    while True:
+        params = {"after": after, "before": before, "page": page, "per_page": BATCH_SIZE}
+        params = {k: v for k, v in params.items() if v is not None}
+        response = await make_strava_request("GET", "/athlete/activities", token, params=params)
+        activities = response.json()
+        if not activities:
+            return
+        yield activities
+        page += 1
+
+
+async def stored_activity_pages(activities: Iterable[dict]) -> AsyncIterator[List[dict]]:
+    """Batch already stored activities like fetched pages."""
+    batch = []
+    for activity in activities:
+        batch.append(activity)
+        if len(batch) >= BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def export_activities(pages: AsyncIterator[List[dict]], fmt: str) -> AsyncIterator[bytes]:
+    writer = ExportWriter(ACTIVITY_COLUMNS, fmt)
+    async for activities in pages:
+        yield writer.write([activity_row(a) for a in activities])
+    yield writer.close()
+
+
+async def export_streams(pages: AsyncIterator[List[dict]], fmt: str, token: str = None,
+                         keys: List[str] = None, streams_dir: Optional[str] = None,
+                         budget: RateBudget = None) -> AsyncIterator[bytes]:
+    """Samples of the selected stream types for every activity, read from
+    ``streams_dir`` when the activity was backfilled there.
+
+    Other activities' streams are requested with only ``keys``, bypassing the
+    response cache, and each request waits for ``budget``.
+    """
+    keys = keys or ACTIVITY_STREAM_KEYS
+    budget = budget or export_budget
+    writer = ExportWriter(STREAM_COLUMNS, fmt)
+    async for activities in pages:
+        for activity in activities:
+            path = Path(streams_dir) / f"{activity['id']}.json" if streams_dir else None
+            if path is not None and path.exists():
+                streams = json.loads(path.read_text())
+            else:
+                await budget.acquire()
+                response = await make_strava_request("GET", f"/activities/{activity['id']}/streams", token,
+                                                     params={"keys": ",".join(keys), "key_by_type": "true"})
+                streams = response.json()
+            streams = {k: v for k, v in streams.items() if k in keys}
+            yield writer.write(list(stream_rows(activity["id"], streams)))
+    yield writer.close()
+
+
+async def _write_file(chunks: AsyncIterator[bytes], output: Path) -> None:
+    with output.open("wb") as f:
+        async for chunk in chunks:
+            f.write(chunk)
+
+
+def main() -> None:
+    """Command line entry point."""
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Export Strava activity history to CSV, Parquet or Arrow.")
+    parser.add_argument("output", help="Output file; the format is taken from the extension unless --format is given")
+    parser.add_argument("--format", choices=list(FORMATS), help="Output format")
+    parser.add_argument("--from-dir", help="Read activities (and streams) from a backfill directory instead of Strava")
+    parser.add_argument("--streams", help="Export samples of these comma-separated stream types instead of summaries")
+    parser.add_argument("--token", help="Access token (defaults to STRAVA_ACCESS_TOKEN)")
+    parser.add_argument("--rate", type=float, default=EXPORT_STREAMS_RATE,
+                        help="Stream requests allowed per 15 minutes")
+    args = parser.parse_args()
+
+    if args.streams and not set(args.streams.split(",")) <= set(ACTIVITY_STREAM_KEYS):
+        parser.error(f"--streams must be a comma-separated subset of {','.join(ACTIVITY_STREAM_KEYS)}")
+    output = Path(args.output)
+    fmt = args.format or output.suffix.lstrip(".")
+    token = None if args.from_dir and not args.streams else resolve_token(args.token)
+    if args.from_dir:
+        pages = stored_activity_pages(read_activities(args.from_dir))
+    else:
+        pages = fetch_activity_pages(token)
+    if args.streams:
+        streams_dir = str(Path(args.from_dir) / "streams") if args.from_dir else None
+        chunks = export_streams(pages, fmt, token, args.streams.split(","), streams_dir,
+                                budget=RateBudget(args.rate, per=BACKFILL_PERIOD))
+    else:
+        chunks = export_activities(pages, fmt)
+    asyncio.run(_write_file(chunks, output))
+    print(f"Exported to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+from .records import ActivityRecord
+from .store import activity_store
+
+
+class GearSeries:
+    """One piece of gear's activities ordered by start time, with running totals.
+
+    ``distance[i]`` and ``moving_time[i]`` hold the totals of the first ``i``
+    activities, so the usage between any two dates is the difference of two
+    entries found by binary search. Adding or removing an activity before the
+    newest one only marks the totals from its position as outdated; they are
+    rebuilt once, on the next ``usage`` call, so ingesting a history from
+    newest to oldest stays linear.
+    """
+
+    def __init__(self) -> None:
+        self.starts: List[int] = []
+        self.ids: List[int] = []
+        self.distance: List[float] = [0.0]
+        self.moving_time: List[float] = [0.0]
+        self._values: Dict[int, Tuple[float, float]] = {}
+        # Index of the first activity whose running totals are outdated
+        self._stale_from: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _mark_stale(self, index: int) -> None:
+        self._stale_from = index if self._stale_from is None else min(self._stale_from, index)
+
+    def _refresh_totals(self) -> None:
+        if self._stale_from is None:
+            return
+        index, self._stale_from = self._stale_from, None
+        del self.distance[index + 1:]
+        del self.moving_time[index + 1:]
+        for activity_id in self.ids[index:]:
+            distance, moving_time = self._values[activity_id]
+            self.distance.append(self.distance[-1] + distance)
+            self.moving_time.append(self.moving_time[-1] + moving_time)
+
+    def add(self, record: ActivityRecord) -> None:
+        self._values[record.id] = (record.distance, record.moving_time)
+        if not self.starts or record.start >= self.starts[-1]:
+            # Newest activity: the common case when syncing, O(1)
+            self.starts.append(record.start)
+            self.ids.append(record.id)
+            if self._stale_from is None:
+                self.distance.append(self.distance[-1] + record.distance)
+                self.moving_time.append(self.moving_time[-1] + record.moving_time)
+            return
+        index = bisect_left(self.starts, record.start)
+        self.starts.insert(index, record.start)
+        self.ids.insert(index, record.id)
+        self._mark_stale(index)
+
+    def remove(self, activity_id: int) -> None:
+        if self._values.pop(activity_id, None) is None:
+            return
+        index = self.ids.index(activity_id)
+        del self.starts[index]
+        del self.ids[index]
+        self._mark_stale(index)
+
+    def usage(self, after: Optional[int] = None, before: Optional[int] = None) -> Dict:
+        """Activity count, distance and moving time for activities starting in [after, before)."""
+        self._refresh_totals()
+        i = bisect_left(self.starts, after) if after is not None else 0
+        j = bisect_left(self.starts, before) if before is not None else len(self.starts)
+        j = max(i, j)
+        return {
+            "activities": j - i,
+            "distance_km": round((self.distance[j] - self.distance[i]) / 1000, 2),
+            "moving_time_h": round((self.moving_time[j] - self.moving_time[i]) / 3600, 2),
+        }
+
+
+class GearIndex:
+    """Gear usage keyed by (athlete id, gear id), maintained from activity store changes."""
+
+    def __init__(self) -> None:
+        self._series: Dict[Tuple[int, str], GearSeries] = {}
+        self._activity_gear: Dict[int, Tuple[int, str]] = {}
+
+    def on_store_change(self, event: str, athlete_id: int, payload) -> None:
+        if event == "upsert":
+            self._discard(payload.id)
+            if payload.gear_id:
+                key = (athlete_id, payload.gear_id)
+                self._series.setdefault(key, GearSeries()).add(payload)
+                self._activity_gear[payload.id] = key
+        elif event == "remove":
+            self._discard(payload)
+        elif event == "forget":
+            for key in [k for k in self._series if k[0] == athlete_id]:
+                for activity_id in self._series.pop(key).ids:
+                    self._activity_gear.pop(activity_id, None)
+
+    def _discard(self, activity_id: int) -> None:
+        key = self._activity_gear.pop(activity_id, None)
+        if key is not None:
+            self._series[key].remove(activity_id)
+
+    def series(self, athlete_id: int, gear_id: str) -> Optional[GearSeries]:
+        return self._series.get((athlete_id, gear_id))
+
+
+gear_index = GearIndex()
+activity_store.subscribe(gear_index.on_store_change)
@@ -0,0 +1,78 @@
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+
+from .ratelimit import RateBudget
+from .store import activity_store
+from .utils import fetch_json, fetch_streams
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_ENABLED = os.getenv("STRAVA_PREFETCH", "1") not in ("0", "false", "False")
+# Upstream calls per minute the warmup worker may spend across all tokens
+PREFETCH_RATE = float(os.getenv("STRAVA_PREFETCH_RATE", "10"))
+MAX_TRACKED_TOKENS = 1024
+
+
+class PrefetchWorker:
+    """Warms the response cache for tokens the server has not seen recently.
+
+    Agents usually ask for the athlete, then recent activities, then the
+    streams of the latest activity. When a token is first seen those calls are
+    made in the background so the follow-up tool calls hit the cache.
+    """
+
+    def __init__(self, enabled: bool = PREFETCH_ENABLED, rate: float = PREFETCH_RATE) -> None:
+        self.enabled = enabled
+        self.budget = RateBudget(rate)
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        self._queue: asyncio.Queue = None
+
+    @property
+    def queue(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=MAX_TRACKED_TOKENS)
+        return self._queue
+
+    def notice(self, token: str) -> None:
+        """Schedule a warmup for ``token`` if it has not been seen before."""
+        if not self.enabled or not token:
+            return
+        if token in self._seen:
+            self._seen.move_to_end(token)
+            return
+        self._seen[token] = None
+        if len(self._seen) > MAX_TRACKED_TOKENS:
+            self._seen.popitem(last=False)
+        try:
+            self.queue.put_nowait(token)
+        except asyncio.QueueFull:
+            self._seen.pop(token, None)
+
+    async def warm(self, token: str) -> None:
+        """Prefetch the athlete, zones, latest activities and newest activity's streams."""
+        await self.budget.acquire()
+        athlete = await fetch_json("/athlete", token)
+        activity_store.remember_token(athlete["id"], token)
+        await self.budget.acquire()
+        await fetch_json("/athlete/zones", token)
+        await self.budget.acquire()
+        activities = await fetch_json("/athlete/activities", token, params={"page": 1, "per_page": 30})
+        activity_store.ingest(token, activities)
+        if activities:
+            await self.budget.acquire()
+            await fetch_streams(f"/activities/{activities[0]['id']}/streams", token)
+
+    async def run(self) -> None:
+        while True:
+            token = await self.queue.get()
+            try:
+                await self.warm(token)
+            except Exception as exc:
+                logger.warning("Prefetch failed: %s", exc)
+            finally:
+                self.queue.task_done()
+
+
+prefetch_worker = PrefetchWorker()
@@ -0,0 +1,126 @@
+import argparse
+import asyncio
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List
+
+
+class StackSampler:
+    """Samples one thread's Python stack at a fixed interval into collapsed-stack counts.
+
+    The counts are in the ``frame;frame;frame count`` format read by
+    flamegraph.pl, speedscope and inferno.
+    """
+
+    def __init__(self, thread_id: int, interval: float = 0.001) -> None:
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._running = False
+        self._thread = None
+
+    def _sample(self) -> None:
+        while self._running:
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{Path(code.co_filename).stem}:{code.co_name}")
+                frame = frame.f_back
+            if names:
+                self.stacks[";".join(reversed(names))] += 1
+            time.sleep(self.interval)
+
+    def start(self) -> None:
+        self._running = True
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._running = False
+        self._thread.join()
+
+
+async def replay_tool_calls(calls: List[dict], out_dir: Path, profiler: str, interval: float, repeat: int) -> Dict:
+    """Call every recorded tool in order against the in-process server, profiling each call."""
+    from fastmcp import Client
+    from .server import server
+
+    folded: Dict[str, Counter] = {}
+    profiles: Dict[str, pstats.Stats] = {}
+    timings: Dict[str, List[float]] = {}
+    async with Client(server) as client:
+        for _ in range(repeat):
+            for call in calls:
+                name = call["tool"]
+                if profiler == "cprofile":
+                    profile = cProfile.Profile()
+                    profile.enable()
+                else:
+                    sampler = StackSampler(threading.get_ident(), interval)
+                    sampler.start()
+                started = time.perf_counter()
+                await client.call_tool(name, call.get("arguments"), raise_on_error=False)
+                timings.setdefault(name, []).append(time.perf_counter() - started)
+                if profiler == "cprofile":
+                    profile.disable()
+                    if name in profiles:
+                        profiles[name].add(profile)
+                    else:
+                        profiles[name] = pstats.Stats(profile)
+                else:
+                    sampler.stop()
+                    folded.setdefault(name, Counter()).update(sampler.stacks)
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for name, stats in profiles.items():
+        stats.dump_stats(out_dir / f"{name}.prof")
+    for name, stacks in folded.items():
+        with open(out_dir / f"{name}.folded", "w") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+    return timings
+
+
+def main() -> None:
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(
+        description="Replay recorded MCP tool calls against recorded Strava responses and profile each tool.")
+    parser.add_argument("recording", help="File written with STRAVA_RECORD")
+    parser.add_argument("--out", default="profiles", help="Directory for one profile per operation_id")
+    parser.add_argument("--profiler", choices=["sample", "cprofile"], default="sample",
+                        help="'sample' writes collapsed stacks (<tool>.folded) for flame graphs; "
+                             "'cprofile' writes pstats files (<tool>.prof)")
+    parser.add_argument("--interval", type=float, default=0.001, help="Sampling interval in seconds")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Upstream latency scale: 2 replays twice as fast, 0 without waiting")
+    parser.add_argument("--repeat", type=int, default=1, help="Replay the tool call sequence this many times")
+    args = parser.parse_args()
+
+    # Settings are read at import, so configure replay before loading the server;
+    # analysis runs inline so it shows up in the profile of the calling tool
+    os.environ["STRAVA_REPLAY"] = args.recording
+    os.environ["STRAVA_REPLAY_SPEED"] = str(args.speed)
+    os.environ.setdefault("STRAVA_ANALYSIS_EXECUTOR", "inline")
+    os.environ["STRAVA_RECORD"] = ""
+    from .recording import read_entries
+
+    calls = [entry for entry in read_entries(args.recording) if entry.get("kind") == "tool"]
+    if not calls:
+        parser.error("The recording has no MCP tool calls")
+    timings = asyncio.run(replay_tool_calls(calls, Path(args.out), args.profiler, args.interval, args.repeat))
+
+    print(f"{'operation_id':<36} {'calls':>5} {'mean ms':>9} {'max ms':>9}")
+    for name, values in sorted(timings.items(), key=lambda item: -sum(item[1])):
+        print(f"{name:<36} {len(values):>5} {sum(values) / len(values) * 1000:>9.1f} {max(values) * 1000:>9.1f}")
+    print(f"Profiles written to {args.out}/")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import asyncio
+import time
+
+
+class RateBudget:
+    """Token bucket limiting how many upstream calls a caller may spend.
+
+    ``rate`` requests are allowed per ``per`` seconds, with bursts of up to
+    ``burst`` requests.
+    """
+
+    def __init__(self, rate: float, per: float = 60.0, burst: float = None) -> None:
+        self.rate = rate
+        self.per = per
+        self.capacity = burst if burst is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate / self.per)
+        self._updated = now
+
+    def try_acquire(self, cost: float = 1) -> bool:
+        self._refill()
+        if self._tokens >= cost:
+            self._tokens -= cost
+            return True
+        return False
+
+    async def acquire(self, cost: float = 1) -> None:
+        async with self._lock:
+            while not self.try_acquire(cost):
+                await asyncio.sleep((cost - self._tokens) * self.per / self.rate)
+
+    @property
+    def available(self) -> float:
+        self._refill()
+        return self._tokens
+
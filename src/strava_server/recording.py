@@ -0,0 +1,139 @@
+"""
+Record and replay upstream Strava traffic.
+
+* ``STRAVA_RECORD=<path>`` appends every Strava request with its response,
+  and every MCP tool call, to ``<path>`` as JSON lines (gzipped when the
+  path ends in ``.gz``).
+* ``STRAVA_REPLAY=<path>`` answers Strava requests from such a file instead
+  of the network, waiting for the recorded latency scaled by
+  ``STRAVA_REPLAY_SPEED`` (``2`` replays twice as fast, ``0`` without waiting).
+
+Tokens are never written: requests carry a short hash of the token (see
+``admission.token_label``) and the ``authorization`` argument of tool calls is
+replaced by a placeholder token derived from that hash.
+"""
+import asyncio
+import gzip
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from .admission import token_label
+
+RECORD_PATH = os.getenv("STRAVA_RECORD")
+REPLAY_PATH = os.getenv("STRAVA_REPLAY")
+REPLAY_SPEED = float(os.getenv("STRAVA_REPLAY_SPEED", "1"))
+
+
+def _open(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def _params_key(params: Optional[dict]) -> str:
+    return json.dumps(params or {}, sort_keys=True, default=str)
+
+
+def redact_arguments(arguments: Optional[dict]) -> dict:
+    """Tool arguments with the bearer token replaced by a placeholder of its label."""
+    arguments = dict(arguments or {})
+    authorization = arguments.get("authorization")
+    if isinstance(authorization, str) and authorization.startswith("Bearer "):
+        arguments["authorization"] = f"Bearer replay-{token_label(authorization[7:])}"
+    return arguments
+
+
+def read_entries(path: str) -> List[dict]:
+    entries = []
+    with _open(path, "r") as f:
+        try:
+            for line in f:
+                if line.strip():
+                    entries.append(json.loads(line))
+        except EOFError:
+            # A gzipped recording of a process that was killed has no end marker; keep what was flushed
+            pass
+    return entries
+
+
+class Recorder:
+    """Appends upstream exchanges and tool calls to a JSON lines file."""
+
+    def __init__(self, path: str) -> None:
+        self._file = _open(path, "a")
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _write(self, entry: dict) -> None:
+        entry["at"] = round(time.monotonic() - self._started, 4)
+        with self._lock:
+            self._file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            self._file.flush()
+
+    def upstream(self, method: str, endpoint: str, token: str, params: Optional[dict],
+                 response: httpx.Response, elapsed: float) -> None:
+        self._write({
+            "kind": "upstream", "method": method, "endpoint": endpoint, "params": params or {},
+            "token": token_label(token), "status": response.status_code, "elapsed": round(elapsed, 4),
+            "content_type": response.headers.get("content-type", "application/json"), "body": response.text,
+        })
+
+    def tool(self, name: str, arguments: Optional[dict]) -> None:
+        self._write({"kind": "tool", "tool": name, "arguments": redact_arguments(arguments)})
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class Replay:
+    """Serves recorded upstream responses.
+
+    Requests are matched on method, endpoint and parameters; requests whose
+    parameters differ (e.g. an ``after`` timestamp computed from the current
+    time) fall back to any recording of the same method and endpoint.
+    Repeated requests cycle through the matching recordings in order.
+    """
+
+    def __init__(self, path: str, speed: float = REPLAY_SPEED) -> None:
+        self.speed = speed
+        self._exact: Dict[Tuple[str, str, str], List[dict]] = {}
+        self._by_endpoint: Dict[Tuple[str, str], List[dict]] = {}
+        self._cursors: Dict[tuple, int] = {}
+        for entry in read_entries(path):
+            if entry.get("kind") != "upstream":
+                continue
+            key = (entry["method"], entry["endpoint"])
+            self._by_endpoint.setdefault(key, []).append(entry)
+            self._exact.setdefault(key + (_params_key(entry["params"]),), []).append(entry)
+
+    def _next(self, key: tuple, entries: List[dict]) -> dict:
+        cursor = self._cursors.get(key, 0)
+        self._cursors[key] = cursor + 1
+        return entries[cursor % len(entries)]
+
+    def lookup(self, method: str, endpoint: str, params: Optional[dict]) -> Optional[dict]:
+        exact = (method, endpoint, _params_key(params))
+        if exact in self._exact:
+            return self._next(exact, self._exact[exact])
+        if (method, endpoint) in self._by_endpoint:
+            return self._next((method, endpoint), self._by_endpoint[(method, endpoint)])
+        return None
+
+    async def respond(self, method: str, url: str, endpoint: str, params: Optional[dict]) -> httpx.Response:
+        request = httpx.Request(method, url, params=params)
+        entry = self.lookup(method, endpoint, params)
+        if entry is None:
+            return httpx.Response(404, json={"message": "Not in recording", "endpoint": endpoint}, request=request)
+        if self.speed > 0:
+            await asyncio.sleep(entry["elapsed"] / self.speed)
+        return httpx.Response(entry["status"], content=entry["body"].encode(),
+                              headers={"content-type": entry["content_type"]}, request=request)
+
+
+recorder = Recorder(RECORD_PATH) if RECORD_PATH else None
+replay = Replay(REPLAY_PATH) if REPLAY_PATH else None
@@ -0,0 +1,135 @@
+import sys
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional
+
+
+def utc_timestamp(value: datetime) -> int:
+    """Epoch seconds of a naive UTC datetime."""
+    return int(value.replace(tzinfo=timezone.utc).timestamp())
+
+
+def parse_timestamp(value: str) -> int:
+    """Epoch seconds of a Strava ``YYYY-MM-DDTHH:MM:SSZ`` timestamp."""
+    return utc_timestamp(datetime.strptime(value, "%Y-%m-%dT%H:%M:%SZ"))
+
+
+class ActivityRecord:
+    """The activity fields used by aggregations, the local store and exports.
+
+    Building one is much cheaper than validating a full ``SummaryActivity``,
+    and a slotted instance is a fraction of the size of the decoded JSON.
+    Pydantic models are only built at the API boundary. The fields cover
+    every ``export.ACTIVITY_COLUMNS`` column, so exports from the store match
+    exports from Strava.
+    """
+
+    __slots__ = ("id", "athlete_id", "name", "type", "sport_type", "start", "distance", "moving_time",
+                 "elapsed_time", "total_elevation_gain", "average_speed", "average_heartrate",
+                 "average_watts", "kilojoules", "suffer_score", "gear_id", "trainer", "commute",
+                 "summary_polyline", "start_date_local", "timezone", "max_speed", "max_heartrate",
+                 "weighted_average_watts", "average_cadence", "manual", "private", "kudos_count")
+
+    def __init__(self, id: int, athlete_id: Optional[int], name: str, type: str, sport_type: str, start: int,
+                 distance: float, moving_time: int, elapsed_time: int, total_elevation_gain: float,
+                 average_speed: float = None, average_heartrate: float = None, average_watts: float = None,
+                 kilojoules: float = None, suffer_score: float = None, gear_id: str = None,
+                 trainer: bool = False, commute: bool = False, summary_polyline: str = None,
+                 start_date_local: str = None, timezone: str = None, max_speed: float = None,
+                 max_heartrate: float = None, weighted_average_watts: float = None, average_cadence: float = None,
+                 manual: bool = False, private: bool = False, kudos_count: int = None) -> None:
+        self.id = id
+        self.athlete_id = athlete_id
+        self.name = name
+        self.type = type
+        self.sport_type = sport_type
+        self.start = start
+        self.distance = distance
+        self.moving_time = moving_time
+        self.elapsed_time = elapsed_time
+        self.total_elevation_gain = total_elevation_gain
+        self.average_speed = average_speed
+        self.average_heartrate = average_heartrate
+        self.average_watts = average_watts
+        self.kilojoules = kilojoules
+        self.suffer_score = suffer_score
+        self.gear_id = gear_id
+        self.trainer = trainer
+        self.commute = commute
+        self.summary_polyline = summary_polyline
+        self.start_date_local = start_date_local
+        self.timezone = timezone
+        self.max_speed = max_speed
+        self.max_heartrate = max_heartrate
+        self.weighted_average_watts = weighted_average_watts
+        self.average_cadence = average_cadence
+        self.manual = manual
+        self.private = private
+        self.kudos_count = kudos_count
+
+    @classmethod
+    def from_summary(cls, activity: dict) -> "ActivityRecord":
+        """Build a record from a ``SummaryActivity``/``DetailedActivity`` JSON object."""
+        get = activity.get
+        return cls(
+            activity["id"], (get("athlete") or {}).get("id"), get("name", ""), get("type", ""),
+            get("sport_type") or get("type", ""), parse_timestamp(activity["start_date"]),
+            get("distance") or 0.0, get("moving_time") or 0, get("elapsed_time") or 0,
+            get("total_elevation_gain") or 0.0, get("average_speed"), get("average_heartrate"),
+            get("average_watts"), get("kilojoules"), get("suffer_score"), get("gear_id"),
+            bool(get("trainer")), bool(get("commute")), (get("map") or {}).get("summary_polyline") or None,
+            get("start_date_local"),
+            # Few distinct time zones per athlete, so share the strings
+            sys.intern(get("timezone")) if get("timezone") else None,
+            get("max_speed"), get("max_heartrate"), get("weighted_average_watts"), get("average_cadence"),
+            bool(get("manual")), bool(get("private")), get("kudos_count"),
+        )
+
+    @property
+    def start_date(self) -> str:
+        return datetime.fromtimestamp(self.start, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    def to_summary(self) -> dict:
+        """Summary-shaped dict of the stored fields."""
+        summary = {name: getattr(self, name) for name in self.__slots__
+                   if name not in ("start", "athlete_id", "summary_polyline")}
+        summary["start_date"] = self.start_date
+        summary["athlete"] = {"id": self.athlete_id}
+        summary["map"] = {"summary_polyline": self.summary_polyline}
+        return summary
+
+    def __repr__(self) -> str:
+        return f"ActivityRecord(id={self.id}, type={self.type!r}, start_date={self.start_date!r})"
+
+
+class ActivityBatch:
+    """Column-oriented view of many activities, sorted by start time.
+
+    Numeric columns are stored in typed arrays so aggregations iterate over
+    machine values instead of dicts.
+    """
+
+    def __init__(self, records: Iterable[ActivityRecord]) -> None:
+        records = sorted(records, key=lambda r: r.start)
+        self.ids = array("q", (r.id for r in records))
+        self.start = array("q", (r.start for r in records))
+        self.distance = array("d", (r.distance for r in records))
+        self.moving_time = array("d", (r.moving_time for r in records))
+        self.elevation = array("d", (r.total_elevation_gain for r in records))
+        self.types: List[str] = [r.type for r in records]
+
+    @classmethod
+    def from_summaries(cls, activities: Iterable[dict]) -> "ActivityBatch":
+        return cls(ActivityRecord.from_summary(a) for a in activities)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def index_at(self, timestamp: float) -> int:
+        """Index of the first activity starting at or after ``timestamp``."""
+        return bisect_left(self.start, timestamp)
+
+    def total(self, column: str, since: float = None) -> float:
+        values = getattr(self, column)
+        return sum(values[self.index_at(since):] if since is not None else values)
@@ -0,0 +1,109 @@
+import asyncio
+import os
+import time
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Dict, Optional
+
+FAILURE_THRESHOLD = int(os.getenv("STRAVA_BREAKER_FAILURES", "5"))
+RESET_TIMEOUT = float(os.getenv("STRAVA_BREAKER_RESET", "30"))
+UPSTREAM_TIMEOUT = float(os.getenv("STRAVA_UPSTREAM_TIMEOUT", "10"))
+# Send a second, identical GET if the first has not answered after this many seconds (0 disables)
+HEDGE_DELAY = float(os.getenv("STRAVA_HEDGE_DELAY", "2"))
+
+# Per-request holder for the age of any stale cached data served, read by the
+# server middleware to set the X-Strava-Cache header
+served_stale: ContextVar[Optional[dict]] = ContextVar("served_stale", default=None)
+
+
+class CircuitBreaker:
+    """Stops calling an upstream endpoint group after repeated failures.
+
+    After ``failure_threshold`` consecutive failures the breaker opens and
+    calls are refused for ``reset_timeout`` seconds. Then one trial call is let
+    through (half-open); its outcome closes or re-opens the breaker.
+    """
+
+    def __init__(self, failure_threshold: int = FAILURE_THRESHOLD, reset_timeout: float = RESET_TIMEOUT) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+    def release_trial(self) -> None:
+        """Let another trial through after one ended without an outcome (e.g. it was cancelled)."""
+        self._trial_in_flight = False
+
+
+breakers: Dict[str, CircuitBreaker] = {}
+
+
+def endpoint_group(endpoint: str) -> str:
+    """Breaker group of an endpoint: its first path segment (``/activities/1/streams`` -> ``activities``)."""
+    return endpoint.strip("/").split("/", 1)[0]
+
+
+def breaker_for(endpoint: str) -> CircuitBreaker:
+    group = endpoint_group(endpoint)
+    if group not in breakers:
+        breakers[group] = CircuitBreaker()
+    return breakers[group]
+
+
+async def hedged(call: Callable[[], Awaitable], delay: float = HEDGE_DELAY):
+    """Await ``call()``; if it is still pending after ``delay`` seconds, race a second
+    ``call()`` against it and return whichever succeeds first."""
+    first = asyncio.ensure_future(call())
+    if delay <= 0:
+        return await first
+    done, _ = await asyncio.wait({first}, timeout=delay)
+    if done:
+        return first.result()
+
+    pending = {first, asyncio.ensure_future(call())}
+    error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def mark_stale(age: float) -> None:
+    holder = served_stale.get()
+    if holder is not None:
+        holder["age"] = max(holder.get("age", 0), age)
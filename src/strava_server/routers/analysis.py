@@ -1,10 +1,21 @@
-from fastapi import APIRouter, Path, Query, Header
-from typing import Dict, Any
+import asyncio
+from fastapi import APIRouter, Path, Query, Header, HTTPException
+from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
+from collections import Counter
 from statistics import mean
 from ..utils import *
+from ..tracing import TracedRoute
+from ..executor import run_stream_task
+from ..streams import RESAMPLED_KEYS, aligned_split_summaries, compare_splits
+from ..admission import analysis_admission, stream_cost
+from ..records import ActivityBatch
+from ..store import activity_store
+from ..similarity import decode_polyline, refine, route_index
+from ..zones import (activity_time_in_zones, add_seconds, athlete_zone_sets, describe_zones,
+                     many_time_in_zones, pace_zone_seconds)
 
-analysis_router = APIRouter()
+analysis_router = APIRouter(route_class=TracedRoute)
 
 @analysis_router.get("/analysis/activity-distribution", operation_id="getActivityDistribution")
 async def activity_distribution(
@@ -15,18 +26,21 @@ async def activity_distribution(
 
     after = int((datetime.utcnow() - timedelta(days=days)).timestamp())
     token = extract_bearer_token(authorization)
-    activities = await make_strava_request("GET", "/athlete/activities", token, params={"after": after})
-    
-    type_counts = {}
-    for a in activities:
-        type_counts[a["type"]] = type_counts.get(a["type"], 0) + 1
+    activities = await fetch_json("/athlete/activities", token, params={"after": after, "per_page": 200})
+    batch = ActivityBatch.from_summaries(activities)
     
+    type_counts = Counter(batch.types)
     total = sum(type_counts.values())
+    if not total:
+        return {"days": days, "distribution": {}}
     distribution = {k: f"{(v/total)*100:.1f}%" for k,v in type_counts.items()}
     
     return {"days": days, "distribution": distribution}
 
 
+# Speed (m/s) lower bounds: slower than 6:00 min/km, 6:00-5:00, 5:00-4:00, faster than 4:00
+PACE_ZONES = [("Easy", 0.0), ("Tempo", 1000 / 360), ("Interval", 1000 / 300), ("Sprint", 1000 / 240)]
+
 @analysis_router.get("/analysis/pace-zones/{activity_id}", operation_id="getPaceZones")
 async def pace_zones(
     activity_id: int = Path(..., description="The identifier of the activity"),
@@ -34,27 +48,82 @@ async def pace_zones(
 ) -> Dict[str, Any]:
     """Analyze time spent in pace/speed zones."""
     token = extract_bearer_token(authorization)
-    streams = await make_strava_request("GET", f"/activities/{activity_id}/streams", token, {"keys": "velocity_smooth", "key_by_type": "true"})
+    streams = await fetch_streams(f"/activities/{activity_id}/streams", token, ["time", "velocity_smooth"])
     speeds = streams.get("velocity_smooth", {}).get("data", [])
+    times = streams.get("time", {}).get("data", [])
     
-    if not speeds:
+    if not speeds or not times:
         return {"activity_id": activity_id, "pace_zones": "No speed data"}
     
-    # Convert m/s to min/km
-    paces = [1000/s if s > 0 else None for s in speeds if s > 0]
-    
-    zones = {"Easy":0,"Tempo":0,"Interval":0,"Sprint":0}
-    for p in paces:
-        if p > 6: zones["Easy"] += 1
-        elif 5 <= p <= 6: zones["Tempo"] += 1
-        elif 4 <= p < 5: zones["Interval"] += 1
-        else: zones["Sprint"] += 1
+    async with analysis_admission.slot(token, cost=stream_cost(streams)):
+        seconds = await run_stream_task(pace_zone_seconds, streams, [bound for _, bound in PACE_ZONES])
     
-    total = sum(zones.values())
-    pct = {k: f"{(v/total)*100:.1f}%" for k,v in zones.items()}
+    total = sum(seconds)
+    if not total:
+        return {"activity_id": activity_id, "pace_zones": "No speed data"}
+    pct = {name: f"{(v/total)*100:.1f}%" for (name, _), v in zip(PACE_ZONES, seconds)}
     return {"activity_id": activity_id, "pace_zones": pct}
 
 
+@analysis_router.get("/analysis/zones/{activity_id}", operation_id="getTimeInZones")
+async def activity_zones(
+    activity_id: int = Path(..., description="The identifier of the activity"),
+    authorization: str = Header(..., description="Bearer token for authentication")
+) -> Dict[str, Any]:
+    """Time spent in the athlete's own heart rate and power zones during an activity."""
+    token = extract_bearer_token(authorization)
+    athlete_zones, streams = await asyncio.gather(
+        fetch_json("/athlete/zones", token),
+        fetch_streams(f"/activities/{activity_id}/streams", token, ["time", "heartrate", "watts"]),
+    )
+    zone_sets = athlete_zone_sets(athlete_zones)
+    async with analysis_admission.slot(token, cost=stream_cost(streams)):
+        seconds = await run_stream_task(activity_time_in_zones, streams, zone_sets)
+    return {
+        "activity_id": activity_id,
+        **{key: describe_zones(zone_sets[key], spent) for key, spent in seconds.items()},
+    }
+
+
+@analysis_router.get("/analysis/zone-distribution", operation_id="getWeeklyZoneDistribution")
+async def zone_distribution(
+    weeks: int = Query(4, ge=1, le=12, description="Number of recent weeks"),
+    authorization: str = Header(..., description="Bearer token for authentication")
+) -> Dict[str, Any]:
+    """Weekly time in the athlete's heart rate and power zones across all activities."""
+    after = int((datetime.utcnow() - timedelta(weeks=weeks)).timestamp())
+    token = extract_bearer_token(authorization)
+    athlete_zones, activities = await asyncio.gather(
+        fetch_json("/athlete/zones", token),
+        fetch_json("/athlete/activities", token, params={"after": after, "per_page": 200}),
+    )
+    zone_sets = athlete_zone_sets(athlete_zones)
+    activities = [a for a in activities if a.get("has_heartrate") or a.get("device_watts")]
+
+    semaphore = asyncio.Semaphore(4)
+    async def load(activity):
+        async with semaphore:
+            return await fetch_streams(f"/activities/{activity['id']}/streams", token, ["time", "heartrate", "watts"])
+    all_streams = await asyncio.gather(*[load(a) for a in activities])
+
+    weekly: Dict[str, Dict[str, List[float]]] = {}
+    async with analysis_admission.slot(token, cost=sum(stream_cost(s) for s in all_streams)):
+        per_activity = await run_stream_task(many_time_in_zones, list(all_streams), zone_sets)
+    for activity, activity_seconds in zip(activities, per_activity):
+        year, week, _ = datetime.strptime(activity["start_date"], "%Y-%m-%dT%H:%M:%SZ").isocalendar()
+        totals = weekly.setdefault(f"{year}-W{week:02d}", {})
+        for key, seconds in activity_seconds.items():
+            totals[key] = add_seconds(totals.get(key), seconds)
+
+    return {
+        "weeks": weeks,
+        "weekly": {
+            week: {key: describe_zones(zone_sets[key], seconds) for key, seconds in totals.items()}
+            for week, totals in sorted(weekly.items())
+        },
+    }
+
+
 @analysis_router.get("/analysis/elevation-trends", operation_id="getElevationTrends")
 async def elevation_trends(
     weeks: int = Query(8, description="Number of recent weeks"),
@@ -63,14 +132,107 @@ async def elevation_trends(
     """Weekly elevation gain trends."""
     after = int((datetime.utcnow() - timedelta(weeks=weeks)).timestamp())
     token = extract_bearer_token(authorization)
-    activities = await make_strava_request("GET", "/athlete/activities", token, params={"after": after})
+    activities = await fetch_json("/athlete/activities", token, params={"after": after, "per_page": 200})
+    batch = ActivityBatch.from_summaries(activities)
     
     weekly = {}
-    for a in activities:
-        week = datetime.strptime(a["start_date"], "%Y-%m-%dT%H:%M:%SZ").isocalendar()[1]
-        weekly[week] = weekly.get(week, 0) + a.get("total_elevation_gain", 0)
+    for start, elevation in zip(batch.start, batch.elevation):
+        week = datetime.utcfromtimestamp(start).isocalendar()[1]
+        weekly[week] = weekly.get(week, 0) + elevation
     
     sorted_weeks = dict(sorted(weekly.items()))
+    if len(sorted_weeks) < 2:
+        return {"weekly_elevation_gain": sorted_weeks, "trend": "not enough data"}
     trend = "increasing" if list(sorted_weeks.values())[-1] > mean(list(sorted_weeks.values())[:-1]) else "stable/decreasing"
     
     return {"weekly_elevation_gain": sorted_weeks, "trend": trend}
+
+
+# Smallest split per grid (meters or seconds) and most grid points one activity is resampled onto
+MIN_SPLIT = {"distance": 50, "time": 10}
+MAX_GRID_POINTS = 100_000
+
+@analysis_router.get("/analysis/compare", operation_id="compareActivities")
+async def compare_activities(
+    activity_ids: List[int] = Query(..., description="Two to five activity identifiers; the first is the baseline"),
+    grid: str = Query("distance", description="Alignment axis: 'distance' or 'time'"),
+    split: float = Query(1000, ge=10, description="Split size in meters (distance grid, at least 50) or seconds (time grid, at least 10)"),
+    authorization: str = Header(..., description="Bearer token for authentication")
+) -> Dict[str, Any]:
+    """Compare activities split by split (pace, HR and power deltas against the first)."""
+    if not 2 <= len(activity_ids) <= 5:
+        raise HTTPException(status_code=400, detail="Provide between 2 and 5 activity_ids")
+    if grid not in ("distance", "time"):
+        raise HTTPException(status_code=400, detail="grid must be 'distance' or 'time'")
+    if split < MIN_SPLIT[grid]:
+        raise HTTPException(status_code=400, detail=f"split must be at least {MIN_SPLIT[grid]} on the {grid} grid")
+    token = extract_bearer_token(authorization)
+
+    all_streams = await asyncio.gather(*[
+        fetch_streams(f"/activities/{activity_id}/streams", token, RESAMPLED_KEYS)
+        for activity_id in activity_ids
+    ])
+    for activity_id, streams in zip(activity_ids, all_streams):
+        if not streams.get("time", {}).get("data") or not streams.get("distance", {}).get("data"):
+            raise HTTPException(status_code=422, detail=f"Activity {activity_id} has no time/distance streams")
+
+    # Only the span covered by every activity can be compared
+    length = min(streams[grid]["data"][-1] for streams in all_streams)
+    points_per_split = 10
+    step = split / points_per_split
+    if length / step > MAX_GRID_POINTS:
+        raise HTTPException(status_code=400, detail=f"split is too small for these activities; "
+                                                    f"use at least {length * points_per_split / MAX_GRID_POINTS:.0f}")
+    async with analysis_admission.slot(token, cost=sum(stream_cost(s) for s in all_streams)):
+        per_activity = await run_stream_task(aligned_split_summaries, list(all_streams), grid, step, length,
+                                             points_per_split)
+    return {
+        "activity_ids": activity_ids,
+        "grid": grid,
+        "split": split,
+        "units": {"pace": "s/km", "heartrate": "bpm", "watts": "W"},
+        "splits": compare_splits(per_activity),
+    }
+
+
+@analysis_router.get("/analysis/similar-activities", operation_id="findSimilarActivities")
+async def similar_activities(
+    activity_id: Optional[int] = Query(None, description="Find activities following this activity's route"),
+    route_id: Optional[int] = Query(None, description="Find activities following this saved route"),
+    max_distance: float = Query(200, gt=0, description="Maximum path distance in meters"),
+    min_overlap: float = Query(0.5, gt=0, le=1, description="Minimum share of grid cells in common (0-1)"),
+    metric: str = Query("frechet", description="Path distance: 'frechet' or 'hausdorff'"),
+    limit: int = Query(20, ge=1, le=100, description="Maximum number of matches"),
+    authorization: str = Header(..., description="Bearer token for authentication")
+) -> Dict[str, Any]:
+    """Synced activities that follow the same route as an activity or saved route."""
+    if (activity_id is None) == (route_id is None):
+        raise HTTPException(status_code=400, detail="Provide exactly one of activity_id or route_id")
+    if metric not in ("frechet", "hausdorff"):
+        raise HTTPException(status_code=400, detail="metric must be 'frechet' or 'hausdorff'")
+    token = extract_bearer_token(authorization)
+    athlete = await fetch_json("/athlete", token)
+
+    if activity_id is not None:
+        detail = await fetch_json(f"/activities/{activity_id}", token, ttl=ACTIVITY_TTL)
+    else:
+        detail = await fetch_json(f"/routes/{route_id}", token)
+    track = decode_polyline((detail.get("map") or {}).get("summary_polyline") or "")
+    if len(track) < 2:
+        raise HTTPException(status_code=422, detail="No GPS track to compare")
+
+    query, overlaps, paths = route_index.candidate_paths(athlete["id"], track, min_overlap, exclude=activity_id)
+    streams = [{"path": {"data": path}} for path in [query] + paths]
+    async with analysis_admission.slot(token, cost=max(1.0, len(paths) / 100)):
+        distances = await run_stream_task(refine, streams, max_distance, metric)
+    matches = sorted(
+        ({"activity_id": candidate, "distance_m": distance, "overlap": round(overlap, 2)}
+         for (candidate, overlap), distance in zip(overlaps.items(), distances) if distance is not None),
+        key=lambda m: m["distance_m"],
+    )[:limit]
+    for match in matches:
+        record = activity_store.get(athlete["id"], match["activity_id"])
+        match.update(name=record.name, type=record.type, start_date=record.start_date,
+                     distance_km=record.distance / 1000, moving_time=record.moving_time)
+    return {"activity_id": activity_id, "route_id": route_id, "metric": metric,
+            "indexed_activities": len(route_index), "matches": matches}
@@ -1,9 +1,21 @@
+import asyncio
+from bisect import bisect_left
 from fastapi import HTTPException, Query, Path, Header, APIRouter, Response
 
 from ..models import *
 from ..utils import *
+from ..tracing import TracedRoute
+from ..cache import CLUB_TTL, response_cache
+from ..clubs import club_totals, dedup_activities, dedup_members
+from ..explore import explore_tiled
+from ..gear import gear_index
+from ..admission import analysis_admission, upstream_admission
+from ..resilience import breakers
+from ..records import utc_timestamp
+from ..store import activity_store
+from ..streams import DOWNSAMPLE_METHODS, downsample
 
-router = APIRouter()
+router = APIRouter(route_class=TracedRoute)
 
 @router.get("/athletes/{athlete_id}/stats", operation_id="getAthleteStats", response_model=ActivityStats)
 async def get_athlete_stats(
@@ -21,8 +33,9 @@ async def get_authenticated_athlete(
 ):
     """Returns the currently authenticated athlete."""
     token = extract_bearer_token(authorization)
-    response = await make_strava_request("GET", "/athlete", token)
-    return response.json()
+    athlete = await fetch_json("/athlete", token)
+    activity_store.remember_token(athlete["id"], token)
+    return athlete
 
 @router.put("/athlete", operation_id="updateAuthenticatedAthlete", response_model=DetailedAthlete)
 async def update_authenticated_athlete(
@@ -33,6 +46,7 @@ async def update_authenticated_athlete(
     token = extract_bearer_token(authorization)
     data = {"weight": weight}
     response = await make_strava_request("PUT", "/athlete", token, data=data)
+    response_cache.invalidate("/athlete", token=token)
     return response.json()
 
 @router.get("/athlete/zones", operation_id="getAuthenticatedAthleteZones")
@@ -41,8 +55,7 @@ async def get_authenticated_athlete_zones(
 ):
     """Returns the authenticated athlete's heart rate and power zones."""
     token = extract_bearer_token(authorization)
-    response = await make_strava_request("GET", "/athlete/zones", token)
-    return response.json()
+    return await fetch_json("/athlete/zones", token)
 
 # Segments Endpoints
 @router.get("/segments/{segment_id}", operation_id="getSegmentById", response_model=DetailedSegment)
@@ -59,10 +72,14 @@ async def get_segment_by_id(
 async def get_starred_segments(
     page: Optional[int] = Query(1, description="Page number"),
     per_page: Optional[int] = Query(30, description="Number of items per page"),
+    limit: Optional[int] = Query(None, ge=1, description="Collect up to this many items across pages in one call"),
+    fetch_all: bool = Query(False, alias="all", description="Collect every page in one call, up to the server's item cap"),
     authorization: str = Header(..., description="Bearer token for authentication")
 ):
     """List of the authenticated athlete's starred segments."""
     token = extract_bearer_token(authorization)
+    if limit or fetch_all:
+        return await fetch_all_pages("/segments/starred", token, limit=limit)
     params = {"page": page, "per_page": per_page}
     response = await make_strava_request("GET", "/segments/starred", token, params=params)
     return response.json()
@@ -88,6 +105,25 @@ async def explore_segments(
     response = await make_strava_request("GET", "/segments/explore", token, params=params)
     return response.json()
 
+@router.get("/segments/explore/tiled", operation_id="exploreSegmentsTiled")
+async def explore_segments_tiled(
+    bounds: List[float] = Query(..., description="Area to search: south-west lat, south-west lng, north-east lat, north-east lng"),
+    activity_type: Optional[str] = Query(None, description="Desired activity type"),
+    min_cat: Optional[int] = Query(None, ge=0, le=5, description="Minimum climbing category"),
+    max_cat: Optional[int] = Query(None, ge=0, le=5, description="Maximum climbing category"),
+    authorization: str = Header(..., description="Bearer token for authentication")
+):
+    """Returns segments across a large area (e.g. a whole city) by exploring it in cached grid tiles."""
+    if len(bounds) != 4 or bounds[0] >= bounds[2] or bounds[1] >= bounds[3]:
+        raise HTTPException(status_code=400, detail="bounds must be sw_lat, sw_lng, ne_lat, ne_lng")
+    token = extract_bearer_token(authorization)
+    params = {"activity_type": activity_type, "min_cat": min_cat, "max_cat": max_cat}
+    params = {k: v for k, v in params.items() if v is not None}
+    try:
+        return await explore_tiled(token, bounds, params)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
 # Segment Efforts Endpoints
 @router.get("/segment_efforts", operation_id="getSegmentEfforts")
 async def get_segment_efforts(
@@ -129,8 +165,7 @@ async def get_activity_by_id(
     print(authorization)
     token = extract_bearer_token(authorization)
     params = {"include_all_efforts": include_all_efforts} if include_all_efforts else {}
-    response = await make_strava_request("GET", f"/activities/{activity_id}", token, params=params)
-    return response.json()
+    return await fetch_json(f"/activities/{activity_id}", token, params=params, ttl=ACTIVITY_TTL)
 
 @router.get("/athlete/activities", operation_id="getAthleteActivities", response_model=List[SummaryActivity])
 async def get_athlete_activities(
@@ -144,8 +179,9 @@ async def get_athlete_activities(
     token = extract_bearer_token(authorization)
     params = {"before": before, "after": after, "page": page, "per_page": per_page}
     params = {k: v for k, v in params.items() if v is not None}
-    response = await make_strava_request("GET", "/athlete/activities", token, params=params)
-    return response.json()
+    activities = await fetch_json("/athlete/activities", token, params=params)
+    activity_store.ingest(token, activities)
+    return activities
 
 @router.get("/activities/{activity_id}/laps", operation_id="getActivityLaps")
 async def get_activity_laps(
@@ -174,10 +210,15 @@ async def get_activity_comments(
     per_page: Optional[int] = Query(30, description="Items per page (deprecated)"),
     page_size: Optional[int] = Query(30, description="Number of items per page"),
     after_cursor: Optional[str] = Query(None, description="Cursor for pagination"),
+    limit: Optional[int] = Query(None, ge=1, description="Collect up to this many items across pages in one call"),
+    fetch_all: bool = Query(False, alias="all", description="Collect every page in one call, up to the server's item cap"),
     authorization: str = Header(..., description="Bearer token for authentication")
 ):
     """Returns the comments on the given activity."""
     token = extract_bearer_token(authorization)
+    if limit or fetch_all:
+        return await fetch_all_pages(f"/activities/{activity_id}/comments", token, limit=limit,
+                                     size_param="page_size", cursor_param="after_cursor")
     params = {
         "page": page,
         "per_page": per_page,
@@ -193,10 +234,14 @@ async def get_activity_kudos(
     activity_id: int = Path(..., description="The identifier of the activity"),
     page: Optional[int] = Query(1, description="Page number"),
     per_page: Optional[int] = Query(30, description="Number of items per page"),
+    limit: Optional[int] = Query(None, ge=1, description="Collect up to this many items across pages in one call"),
+    fetch_all: bool = Query(False, alias="all", description="Collect every page in one call, up to the server's item cap"),
     authorization: str = Header(..., description="Bearer token for authentication")
 ):
     """Returns the athletes who kudoed an activity."""
     token = extract_bearer_token(authorization)
+    if limit or fetch_all:
+        return await fetch_all_pages(f"/activities/{activity_id}/kudos", token, limit=limit)
     params = {"page": page, "per_page": per_page}
     response = await make_strava_request("GET", f"/activities/{activity_id}/kudos", token, params=params)
     return response.json()
@@ -217,10 +262,14 @@ async def get_club_members(
     club_id: int = Path(..., description="The identifier of the club"),
     page: Optional[int] = Query(1, description="Page number"),
     per_page: Optional[int] = Query(30, description="Number of items per page"),
+    limit: Optional[int] = Query(None, ge=1, description="Collect up to this many items across pages in one call"),
+    fetch_all: bool = Query(False, alias="all", description="Collect every page in one call, up to the server's item cap"),
     authorization: str = Header(..., description="Bearer token for authentication")
 ):
     """Returns club members."""
     token = extract_bearer_token(authorization)
+    if limit or fetch_all:
+        return await fetch_all_pages(f"/clubs/{club_id}/members", token, limit=limit)
     params = {"page": page, "per_page": per_page}
     response = await make_strava_request("GET", f"/clubs/{club_id}/members", token, params=params)
     return response.json()
@@ -238,14 +287,45 @@ async def get_club_activities(
     response = await make_strava_request("GET", f"/clubs/{club_id}/activities", token, params=params)
     return response.json()
 
+@router.get("/clubs/{club_id}/summary", operation_id="getClubSummary")
+async def get_club_summary(
+    club_id: int = Path(..., description="The identifier of the club"),
+    max_activities: int = Query(200, ge=1, le=1000, description="How many recent feed activities to aggregate"),
+    authorization: str = Header(..., description="Bearer token for authentication")
+):
+    """Returns a club's member count, recent feed totals and distance leaderboard in one call."""
+    token = extract_bearer_token(authorization)
+    key = response_cache.make_key(f"/clubs/{club_id}/summary", token, {"max_activities": max_activities})
+    summary = response_cache.get(key)
+    if summary is not None:
+        return summary
+
+    members, activities = await asyncio.gather(
+        fetch_all_pages(f"/clubs/{club_id}/members", token, per_page=200, max_items=25 * 200, ttl=CLUB_TTL),
+        fetch_all_pages(f"/clubs/{club_id}/activities", token, limit=max_activities, ttl=CLUB_TTL),
+    )
+    activities = dedup_activities(activities)[:max_activities]
+    summary = {
+        "club_id": club_id,
+        "members": len(dedup_members(members)),
+        # Strava does not date club feed entries, so totals cover the most recent activities
+        "feed": club_totals(activities),
+    }
+    response_cache.set(key, summary, CLUB_TTL)
+    return summary
+
 @router.get("/athlete/clubs", response_model=List[SummaryClub], operation_id="getAthleteClubs")
 async def get_athlete_clubs(
     page: Optional[int] = Query(1, description="Page number"),
     per_page: Optional[int] = Query(30, description="Number of items per page"),
+    limit: Optional[int] = Query(None, ge=1, description="Collect up to this many items across pages in one call"),
+    fetch_all: bool = Query(False, alias="all", description="Collect every page in one call, up to the server's item cap"),
     authorization: str = Header(..., description="Bearer token for authentication")
 ):
     """Returns clubs the authenticated athlete belongs to."""
     token = extract_bearer_token(authorization)
+    if limit or fetch_all:
+        return await fetch_all_pages("/athlete/clubs", token, limit=limit)
     params = {"page": page, "per_page": per_page}
     response = await make_strava_request("GET", "/athlete/clubs", token, params=params)
     return response.json()
@@ -261,6 +341,43 @@ async def get_gear_by_id(
     response = await make_strava_request("GET", f"/gear/{gear_id}", token)
     return response.json()
 
+@router.get("/gear/{gear_id}/usage", operation_id="getGearUsage")
+async def get_gear_usage(
+    gear_id: str = Path(..., description="The identifier of the gear"),
+    after: Optional[int] = Query(None, description="Only activities starting at or after this timestamp"),
+    before: Optional[int] = Query(None, description="Only activities starting before this timestamp"),
+    group_by: Optional[str] = Query(None, description="Set to 'month' for a per-month breakdown"),
+    authorization: str = Header(..., description="Bearer token for authentication")
+):
+    """Returns distance and time logged on a piece of gear in a date window, from locally synced activities."""
+    if group_by not in (None, "month"):
+        raise HTTPException(status_code=400, detail="group_by must be 'month'")
+    token = extract_bearer_token(authorization)
+    athlete = await fetch_json("/athlete", token)
+    series = gear_index.series(athlete["id"], gear_id)
+    if series is None or not len(series):
+        return {"gear_id": gear_id, "activities": 0, "distance_km": 0.0, "moving_time_h": 0.0,
+                "note": "No synced activities use this gear; list activities or run a backfill first"}
+
+    usage = {"gear_id": gear_id, **series.usage(after, before),
+             "synced_since": datetime.utcfromtimestamp(series.starts[0]).strftime("%Y-%m-%dT%H:%M:%SZ")}
+    if group_by == "month":
+        # Months run from the first to the last activity in the window, whatever the window's bounds
+        first = bisect_left(series.starts, after) if after is not None else 0
+        end = min(before, series.starts[-1] + 1) if before is not None else series.starts[-1] + 1
+        months = {}
+        if first < len(series.starts) and series.starts[first] < end:
+            start = datetime.utcfromtimestamp(series.starts[first])
+            month = datetime(start.year, start.month, 1)
+            while utc_timestamp(month) < end:
+                next_month = datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+                window_start = max(after or 0, utc_timestamp(month))
+                window_end = min(end, utc_timestamp(next_month))
+                months[month.strftime("%Y-%m")] = series.usage(window_start, window_end)
+                month = next_month
+        usage["monthly"] = months
+    return usage
+
 # Routes Endpoints
 @router.get("/routes/{route_id}", operation_id="getRouteById")
 async def get_route_by_id(
@@ -277,30 +394,37 @@ async def get_athlete_routes(
     athlete_id: int = Path(..., description="The identifier of the athlete"),
     page: Optional[int] = Query(1, description="Page number"),
     per_page: Optional[int] = Query(30, description="Number of items per page"),
+    limit: Optional[int] = Query(None, ge=1, description="Collect up to this many items across pages in one call"),
+    fetch_all: bool = Query(False, alias="all", description="Collect every page in one call, up to the server's item cap"),
     authorization: str = Header(..., description="Bearer token for authentication")
 ):
     """Returns routes created by the athlete."""
     token = extract_bearer_token(authorization)
+    if limit or fetch_all:
+        return await fetch_all_pages(f"/athletes/{athlete_id}/routes", token, limit=limit)
     params = {"page": page, "per_page": per_page}
     response = await make_strava_request("GET", f"/athletes/{athlete_id}/routes", token, params=params)
     return response.json()
 
 # Streams Endpoints
+def _check_downsample(method: str) -> None:
+    if method not in DOWNSAMPLE_METHODS:
+        raise HTTPException(status_code=400, detail=f"downsample_method must be one of {', '.join(DOWNSAMPLE_METHODS)}")
+
 @router.get("/activities/{activity_id}/streams", operation_id="getSegmentStreams")
 async def get_activity_streams(
     activity_id: int = Path(..., description="The identifier of the activity"),
     keys: List[StreamTypeEnum] = Query(..., description="Desired stream types"),
     key_by_type: bool = Query(True, description="Must be true"),
+    max_points: Optional[int] = Query(None, ge=4, description="Downsample every stream to at most this many aligned samples"),
+    downsample_method: str = Query("lttb", description="Downsampling method: 'lttb' (largest-triangle-three-buckets) or 'minmax'"),
     authorization: str = Header(..., description="Bearer token for authentication")
 ):
     """Returns the given activity's streams."""
+    _check_downsample(downsample_method)
     token = extract_bearer_token(authorization)
-    params = {
-        "keys": ",".join(keys),
-        "key_by_type": key_by_type
-    }
-    response = await make_strava_request("GET", f"/activities/{activity_id}/streams", token, params=params)
-    return response.json()
+    streams = await fetch_streams(f"/activities/{activity_id}/streams", token, keys)
+    return downsample(streams, max_points, downsample_method) if max_points else streams
 
 @router.get("/segment_efforts/{effort_id}/streams", 
             operation_id="getSegmentEffortStreams", 
@@ -310,25 +434,27 @@ async def get_segment_effort_streams(
     effort_id: int = Path(..., description="The identifier of the segment effort"),
     keys: List[StreamTypeEnum] = Query(..., description="The types of streams to return"),
     key_by_type: bool = Query(True, description="Must be true"),
+    max_points: Optional[int] = Query(None, ge=4, description="Downsample every stream to at most this many aligned samples"),
+    downsample_method: str = Query("lttb", description="Downsampling method: 'lttb' (largest-triangle-three-buckets) or 'minmax'"),
     authorization: str = Header(..., description="Bearer token for authentication")
 ):
     """Returns streams for a segment effort."""
+    _check_downsample(downsample_method)
     token = extract_bearer_token(authorization)
-    params = {
-        "keys": ",".join(keys),
-        "key_by_type": key_by_type
-    }
-    response = await make_strava_request("GET", f"/segment_efforts/{effort_id}/streams", token, params=params)
-    return response.json()
+    streams = await fetch_streams(f"/segment_efforts/{effort_id}/streams", token, keys)
+    return downsample(streams, max_points, downsample_method) if max_points else streams
 
 @router.get("/segments/{segment_id}/streams", operation_id="getSegmentStreamById")
 async def get_segment_streams(
     segment_id: int = Path(..., description="The identifier of the segment"),
     keys: List[str] = Query(..., description="The types of streams to return"),
     key_by_type: bool = Query(True, description="Must be true"),
+    max_points: Optional[int] = Query(None, ge=4, description="Downsample every stream to at most this many aligned samples"),
+    downsample_method: str = Query("lttb", description="Downsampling method: 'lttb' (largest-triangle-three-buckets) or 'minmax'"),
     authorization: str = Header(..., description="Bearer token for authentication")
 ):
     """Returns the given segment's streams."""
+    _check_downsample(downsample_method)
     token = extract_bearer_token(authorization)
     # Validate keys for segments (only distance, latlng, altitude allowed)
     valid_keys = ["distance", "latlng", "altitude"]
@@ -336,12 +462,14 @@ async def get_segment_streams(
         if key not in valid_keys:
             raise HTTPException(status_code=400, detail=f"Invalid key '{key}' for segment streams. Valid keys: {valid_keys}")
     
+    # Always keyed by type: the response shape (and downsample) depends on it
     params = {
         "keys": ",".join(keys),
-        "key_by_type": key_by_type
+        "key_by_type": "true"
     }
     response = await make_strava_request("GET", f"/segments/{segment_id}/streams", token, params=params)
-    return response.json()
+    streams = response.json()
+    return downsample(streams, max_points, downsample_method) if max_points else streams
 
 @router.get("/routes/{route_id}/streams", operation_id="getRouteStreams")
 async def get_route_streams(
@@ -357,7 +485,19 @@ async def get_route_streams(
 @router.get("/health", operation_id="healthCheckForAPI")
 async def health_check():
     """Health check endpoint."""
-    return {"status": "healthy", "service": "Strava API FastAPI Implementation"}
+    return {
+        "status": "healthy",
+        "service": "Strava API FastAPI Implementation",
+        "upstream": {group: breaker.state for group, breaker in breakers.items()},
+    }
+
+@router.get("/metrics/admission", operation_id="getAdmissionMetrics")
+async def admission_metrics():
+    """Admission control metrics for upstream calls and stream analysis."""
+    return {
+        scheduler.name: scheduler.metrics()
+        for scheduler in (upstream_admission, analysis_admission)
+    }
 
 # Root endpoint with API information
 @router.get("/")
@@ -0,0 +1,68 @@
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+
+from ..export import (FORMATS, ExportWriter, ACTIVITY_COLUMNS, export_activities, export_streams,
+                      fetch_activity_pages, stored_activity_pages)
+from ..store import activity_store
+from ..utils import *
+from ..tracing import TracedRoute
+
+export_router = APIRouter(route_class=TracedRoute)
+
+SOURCES = ("strava", "store")
+
+async def _activity_pages(token: str, source: str, after: Optional[int], before: Optional[int]):
+    # Checked here, before the response starts; errors while streaming can only cut the file short
+    if source not in SOURCES:
+        raise HTTPException(status_code=400, detail=f"source must be one of {', '.join(SOURCES)}")
+    if source == "store":
+        athlete = await fetch_json("/athlete", token)
+        activities = [
+            record.to_summary() for record in reversed(activity_store.activities(athlete["id"]))
+            if (after is None or record.start > after) and (before is None or record.start < before)
+        ]
+        return stored_activity_pages(activities)
+    return fetch_activity_pages(token, after, before)
+
+def _check_format(fmt: str) -> None:
+    try:
+        ExportWriter(ACTIVITY_COLUMNS, fmt)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+def _streaming(chunks, fmt: str, name: str) -> StreamingResponse:
+    return StreamingResponse(chunks, media_type=FORMATS[fmt],
+                             headers={"Content-Disposition": f'attachment; filename="{name}.{fmt}"'})
+
+@export_router.get("/export/activities", operation_id="exportActivities")
+async def export_activity_history(
+    fmt: str = Query("csv", alias="format", description="Output format: csv, parquet or arrow"),
+    source: str = Query("strava", description="'strava' to page through the API, 'store' for locally stored activities"),
+    after: Optional[int] = Query(None, description="Only activities after this timestamp"),
+    before: Optional[int] = Query(None, description="Only activities before this timestamp"),
+    authorization: str = Header(..., description="Bearer token for authentication")
+):
+    """Streams the athlete's activity summaries as a columnar file."""
+    _check_format(fmt)
+    token = extract_bearer_token(authorization)
+    pages = await _activity_pages(token, source, after, before)
+    return _streaming(export_activities(pages, fmt), fmt, "activities")
+
+@export_router.get("/export/streams", operation_id="exportActivityStreams")
+async def export_activity_streams(
+    keys: List[str] = Query(["time", "distance", "heartrate", "watts"], description="Stream types to export"),
+    fmt: str = Query("csv", alias="format", description="Output format: csv, parquet or arrow"),
+    source: str = Query("strava", description="'strava' to page through the API, 'store' for locally stored activities"),
+    after: Optional[int] = Query(None, description="Only activities after this timestamp"),
+    before: Optional[int] = Query(None, description="Only activities before this timestamp"),
+    authorization: str = Header(..., description="Bearer token for authentication")
+):
+    """Streams one row per sample of the selected streams for every matching activity."""
+    _check_format(fmt)
+    unknown = [key for key in keys if key not in ACTIVITY_STREAM_KEYS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown stream types {unknown}; use {ACTIVITY_STREAM_KEYS}")
+    token = extract_bearer_token(authorization)
+    pages = await _activity_pages(token, source, after, before)
+    return _streaming(export_streams(pages, fmt, token, keys), fmt, "streams")
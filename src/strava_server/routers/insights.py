@@ -1,10 +1,16 @@
-from fastapi import APIRouter, Header, Path
-from typing import Dict, Any
+from fastapi import APIRouter, Header, HTTPException, Path, Query
+from typing import Dict, Any, Optional
 from datetime import datetime, timedelta
-from statistics import mean
 from ..utils import *
+from ..tracing import TracedRoute
+from ..admission import analysis_admission, stream_cost
+from ..executor import run_stream_task
+from ..records import ActivityBatch, utc_timestamp
+from ..digests import digest_index, next_period_start, period_start
+from ..store import activity_store
+from ..streams import hr_efficiency
 
-insights_router = APIRouter()
+insights_router = APIRouter(route_class=TracedRoute)
 
 @insights_router.get("/insights/performance-efficiency/{activity_id}", operation_id="getPerformanceEfficiency")
 async def performance_efficiency(
@@ -14,7 +20,7 @@ async def performance_efficiency(
     """Check if HR efficiency improved within an activity."""
     token = extract_bearer_token(authorization)
 
-    streams = await make_strava_request("GET", f"/activities/{activity_id}/streams", token, {"keys":"heartrate,velocity_smooth","key_by_type":"true"})
+    streams = await fetch_streams(f"/activities/{activity_id}/streams", token, ["heartrate", "velocity_smooth"])
     
     hr = streams.get("heartrate", {}).get("data", [])
     spd = streams.get("velocity_smooth", {}).get("data", [])
@@ -22,11 +28,10 @@ async def performance_efficiency(
     if not hr or not spd:
         return {"insight": "No HR or speed data"}
     
-    avg_hr = mean(hr)
-    avg_speed = mean(spd) * 3.6  # km/h
+    async with analysis_admission.slot(token, cost=stream_cost(streams)):
+        result = await run_stream_task(hr_efficiency, streams)
     
-    efficiency = avg_speed / avg_hr
-    return {"insight": f"Efficiency score {efficiency:.2f} (km/h per bpm). Higher = better.", "avg_hr": avg_hr, "avg_speed_kmh": avg_speed}
+    return {"insight": f"Efficiency score {result['efficiency']:.2f} (km/h per bpm). Higher = better.", "avg_hr": result["avg_hr"], "avg_speed_kmh": result["avg_speed_kmh"]}
 
 
 @insights_router.get("/insights/recovery-risk", operation_id="getRecoveryRisk")
@@ -37,11 +42,11 @@ async def recovery_risk(
     after_28 = int((datetime.utcnow() - timedelta(days=28)).timestamp())
     after_7 = int((datetime.utcnow() - timedelta(days=7)).timestamp())
     token = extract_bearer_token(authorization)
-    all_28 = await make_strava_request("GET", "/athlete/activities", token, params={"after": after_28})
-    all_7 = [a for a in all_28 if datetime.strptime(a["start_date"], "%Y-%m-%dT%H:%M:%SZ").timestamp() >= after_7]
+    activities = await fetch_json("/athlete/activities", token, params={"after": after_28, "per_page": 200})
+    batch = ActivityBatch.from_summaries(activities)
     
-    load_28 = sum([a["distance"] for a in all_28])
-    load_7 = sum([a["distance"] for a in all_7])
+    load_28 = batch.total("distance")
+    load_7 = batch.total("distance", since=after_7)
     
     risk = "balanced"
     if load_7 > (load_28/4)*1.3:
@@ -50,3 +55,48 @@ async def recovery_risk(
         risk = "low load (possible detraining)"
     
     return {"load_7_days_km": load_7/1000, "load_28_days_km": load_28/1000, "risk": risk}
+
+
+async def _digest(period: str, date: Optional[str], token: str) -> Dict[str, Any]:
+    try:
+        moment = datetime.strptime(date, "%Y-%m-%d") if date else datetime.utcnow()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="date must be YYYY-MM-DD")
+    start = period_start(period, moment)
+    athlete = await fetch_json("/athlete", token)
+    if not digest_index.covers(athlete["id"], period, start):
+        # Window not synced recently: load it in full, changes in between arrive through the store
+        previous_start = period_start(period, start - timedelta(days=1))
+        activities = await fetch_all_pages("/athlete/activities", token, params={
+            "after": utc_timestamp(previous_start) - 1,
+            "before": utc_timestamp(next_period_start(period, start))})
+        activity_store.ingest(token, activities)
+        digest_index.mark_synced(athlete["id"], period, start)
+    return digest_index.digest(athlete["id"], period, start)
+
+
+@insights_router.get("/insights/digest/daily", operation_id="getDailyDigest")
+async def daily_digest(
+    date: Optional[str] = Query(None, description="Day to summarize (YYYY-MM-DD, UTC); defaults to today"),
+    authorization: str = Header(..., description="Bearer token for authentication")
+) -> Dict[str, Any]:
+    """Compact summary of one day: totals, bests, load and notable activities."""
+    return await _digest("daily", date, extract_bearer_token(authorization))
+
+
+@insights_router.get("/insights/digest/weekly", operation_id="getWeeklyDigest")
+async def weekly_digest(
+    date: Optional[str] = Query(None, description="Any day in the week to summarize (YYYY-MM-DD, UTC); defaults to this week"),
+    authorization: str = Header(..., description="Bearer token for authentication")
+) -> Dict[str, Any]:
+    """Compact summary of one week (Monday to Sunday): totals, bests, load and notable activities."""
+    return await _digest("weekly", date, extract_bearer_token(authorization))
+
+
+@insights_router.get("/insights/digest/monthly", operation_id="getMonthlyDigest")
+async def monthly_digest(
+    date: Optional[str] = Query(None, description="Any day in the month to summarize (YYYY-MM-DD, UTC); defaults to this month"),
+    authorization: str = Header(..., description="Bearer token for authentication")
+) -> Dict[str, Any]:
+    """Compact summary of one month: totals, bests, load and notable activities."""
+    return await _digest("monthly", date, extract_bearer_token(authorization))
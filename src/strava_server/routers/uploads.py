@@ -0,0 +1,38 @@
+from fastapi import APIRouter, Header, HTTPException, Path, Query
+from typing import Any, Dict, List, Optional
+
+from ..tracing import TracedRoute
+from ..uploads import upload_manager
+from ..utils import *
+
+uploads_router = APIRouter(route_class=TracedRoute)
+
+@uploads_router.post("/uploads", operation_id="uploadActivityFiles")
+async def upload_activity_files(
+    files: List[str] = Query(..., description="FIT, TCX or GPX files (optionally .gz), relative to the upload directory"),
+    name: Optional[str] = Query(None, description="Activity name; only used when uploading a single file"),
+    trainer: Optional[bool] = Query(None, description="Mark the activities as trainer activities"),
+    commute: Optional[bool] = Query(None, description="Mark the activities as commutes"),
+    authorization: str = Header(..., description="Bearer token for authentication")
+) -> Dict[str, Any]:
+    """Starts uploading activity files in the background and returns a job id to follow progress."""
+    if not files:
+        raise HTTPException(status_code=400, detail="Provide at least one file")
+    token = extract_bearer_token(authorization)
+    options = {"name": name if len(files) == 1 else None,
+               "trainer": None if trainer is None else int(trainer),
+               "commute": None if commute is None else int(commute)}
+    job = upload_manager.submit(token, files, options)
+    return job.to_dict()
+
+@uploads_router.get("/uploads/jobs/{job_id}", operation_id="getUploadJob")
+async def get_upload_job(
+    job_id: str = Path(..., description="Job id returned by uploadActivityFiles"),
+    authorization: str = Header(..., description="Bearer token for authentication")
+) -> Dict[str, Any]:
+    """Returns per-file progress of an upload job."""
+    token = extract_bearer_token(authorization)
+    job = upload_manager.get(job_id, token)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown upload job")
+    return job.to_dict()
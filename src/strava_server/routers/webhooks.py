@@ -0,0 +1,41 @@
+from fastapi import APIRouter, Body, HTTPException, Query
+from typing import Any, Dict
+
+from ..tracing import TracedRoute
+from ..events import WEBHOOK_SUBSCRIPTION_ID, WEBHOOK_VERIFY_TOKEN, webhook_queue
+
+webhooks_router = APIRouter(route_class=TracedRoute)
+
+
+def require_webhooks() -> None:
+    """Hide the webhook endpoints unless a verify token is configured."""
+    if not WEBHOOK_VERIFY_TOKEN:
+        raise HTTPException(status_code=404, detail="Webhooks are not enabled")
+
+
+@webhooks_router.get("/webhook", operation_id="validateWebhookSubscription")
+async def validate_subscription(
+    hub_mode: str = Query(..., alias="hub.mode"),
+    hub_challenge: str = Query(..., alias="hub.challenge"),
+    hub_verify_token: str = Query(..., alias="hub.verify_token")
+) -> Dict[str, Any]:
+    """Echo the challenge Strava sends when a push subscription is created."""
+    require_webhooks()
+    if hub_mode != "subscribe" or hub_verify_token != WEBHOOK_VERIFY_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid webhook verification request")
+    return {"hub.challenge": hub_challenge}
+
+
+@webhooks_router.post("/webhook", operation_id="receiveWebhookEvent")
+async def receive_event(
+    event: Dict[str, Any] = Body(..., description="Strava push event")
+) -> Dict[str, Any]:
+    """Queue a Strava push event for cache invalidation and activity sync."""
+    require_webhooks()
+    if WEBHOOK_SUBSCRIPTION_ID and str(event.get("subscription_id")) != WEBHOOK_SUBSCRIPTION_ID:
+        raise HTTPException(status_code=403, detail="Unknown subscription")
+    for field in ("object_type", "object_id", "aspect_type", "owner_id"):
+        if field not in event:
+            raise HTTPException(status_code=400, detail=f"Missing field '{field}'")
+    webhook_queue.put_nowait(event)
+    return {"status": "queued"}
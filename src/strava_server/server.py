@@ -1,18 +1,45 @@
-from contextlib import asynccontextmanager
-from fastapi import FastAPI
+import asyncio
+import json
+from contextlib import asynccontextmanager, suppress
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastmcp import FastMCP
+from fastmcp.server.openapi import MCPType, RouteMap
 from dotenv import load_dotenv
+
+# Load .env before the package modules read their settings
+load_dotenv()
+
 from .routers.api import router
 from .routers.analysis import analysis_router
 from .routers.insights import insights_router
-
-load_dotenv()
+from .routers.webhooks import webhooks_router
+from .routers.export import export_router
+from .routers.uploads import uploads_router
+from .prefetch import prefetch_worker
+from .events import run_event_consumer
+from .resilience import served_stale
+from .tracing import TRACING_ENABLED, span
+from .backfill import run_backfill_task
+from .executor import shutdown_executor
+from . import recording
 
 @asynccontextmanager
 async def app_lifespan(app: FastAPI):
+    tasks = [
+        asyncio.create_task(prefetch_worker.run()),
+        asyncio.create_task(run_event_consumer()),
+        asyncio.create_task(run_backfill_task()),
+    ]
     yield
-    pass
+    for task in tasks:
+        task.cancel()
+    for task in tasks:
+        with suppress(asyncio.CancelledError):
+            await task
+    shutdown_executor()
+    if recording.recorder is not None:
+        recording.recorder.close()
 
 @asynccontextmanager
 async def combined_lifespan(fastapi_app: FastAPI):
@@ -35,12 +62,70 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def warm_cache_for_new_tokens(request: Request, call_next):
+    authorization = request.headers.get("authorization", "")
+    if authorization.startswith("Bearer "):
+        prefetch_worker.notice(authorization[7:])
+    return await call_next(request)
+
+@app.middleware("http")
+async def mark_stale_responses(request: Request, call_next):
+    holder = {}
+    served_stale.set(holder)
+    response = await call_next(request)
+    if "age" not in holder:
+        return response
+    age = int(holder["age"])
+    response.headers["X-Strava-Cache"] = f"stale; age={age}"
+    if response.headers.get("content-type") != "application/json":
+        return response
+    # MCP clients only see the body, so dict results also say they are stale
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    payload = json.loads(body)
+    if isinstance(payload, dict):
+        payload["_cache"] = {"stale": True, "age": age}
+        body = json.dumps(payload, separators=(",", ":")).encode()
+    headers = {k: v for k, v in response.headers.items() if k != "content-length"}
+    return Response(body, status_code=response.status_code, headers=headers)
+
+if TRACING_ENABLED:
+    @app.middleware("http")
+    async def trace_requests(request: Request, call_next):
+        with span("http.request", method=request.method, path=request.url.path):
+            return await call_next(request)
+
 app.include_router(router=router, tags=["Athlete"])
 app.include_router(router=analysis_router, tags=["Analysis"])
 app.include_router(router=insights_router, tags=["Insights"])
+app.include_router(router=webhooks_router, tags=["Webhooks"])
+app.include_router(router=export_router, tags=["Export"])
+app.include_router(router=uploads_router, tags=["Uploads"])
 
 server = FastMCP.from_fastapi(app, 
-                 name="MCP server for Strava API")
+                 name="MCP server for Strava API",
+                 # Webhooks are called by Strava, exports return files and metrics are for operators
+                 route_maps=[RouteMap(pattern=r"^/(webhook|export/|metrics/)", mcp_type=MCPType.EXCLUDE)])
+
+if TRACING_ENABLED:
+    from fastmcp.server.middleware import Middleware
+
+    class TraceToolCalls(Middleware):
+        async def on_call_tool(self, context, call_next):
+            with span("mcp.call_tool", tool=context.message.name):
+                return await call_next(context)
+
+    server.add_middleware(TraceToolCalls())
+
+if recording.recorder is not None:
+    from fastmcp.server.middleware import Middleware
+
+    class RecordToolCalls(Middleware):
+        async def on_call_tool(self, context, call_next):
+            recording.recorder.tool(context.message.name, context.message.arguments)
+            return await call_next(context)
+
+    server.add_middleware(RecordToolCalls())
 
 mcp_app = server.http_app(path='/mcp')
 
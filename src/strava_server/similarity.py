@@ -0,0 +1,294 @@
+import math
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+from .store import activity_store
+
+Point = Tuple[float, float]
+
+# Grid cell size in degrees (~550 m of latitude) used for candidate signatures
+CELL_DEGREES = 0.005
+SIMPLIFY_TOLERANCE_M = 20.0
+MAX_POINTS = 100
+# Paths are resampled to evenly spaced vertices before comparing, so discrete distances do not
+# depend on where simplification kept vertices; long paths get wider spacing to bound the cost
+COMPARE_SPACING_M = 25.0
+MAX_COMPARE_POINTS = 150
+METERS_PER_DEGREE = 111_320.0
+
+
+def decode_polyline(encoded: str) -> List[Point]:
+    """Decode a Google encoded polyline (as in Strava's ``map.summary_polyline``) to (lat, lng) pairs."""
+    points = []
+    index = lat = lng = 0
+    while index < len(encoded):
+        for is_lng in (False, True):
+            shift = result = 0
+            while True:
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1F) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            delta = ~(result >> 1) if result & 1 else result >> 1
+            if is_lng:
+                lng += delta
+            else:
+                lat += delta
+        points.append((lat / 1e5, lng / 1e5))
+    return points
+
+
+def project(points: List[Point], origin_lat: float = None) -> List[Point]:
+    """Equirectangular projection to meters; accurate enough at route scale."""
+    if not points:
+        return []
+    scale = math.cos(math.radians(points[0][0] if origin_lat is None else origin_lat))
+    return [(lng * METERS_PER_DEGREE * scale, lat * METERS_PER_DEGREE) for lat, lng in points]
+
+
+def _segment_distance(p: Point, a: Point, b: Point) -> float:
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    if dx == dy == 0:
+        return math.dist(p, a)
+    t = max(0.0, min(1.0, ((p[0] - a[0]) * dx + (p[1] - a[1]) * dy) / (dx * dx + dy * dy)))
+    return math.dist(p, (a[0] + t * dx, a[1] + t * dy))
+
+
+def simplify(points: List[Point], tolerance: float = SIMPLIFY_TOLERANCE_M) -> List[Point]:
+    """Douglas-Peucker simplification of projected points, capped at MAX_POINTS."""
+    if len(points) < 3:
+        return list(points)
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        farthest, distance = None, tolerance
+        for i in range(first + 1, last):
+            d = _segment_distance(points[i], points[first], points[last])
+            if d > distance:
+                farthest, distance = i, d
+        if farthest is not None:
+            keep[farthest] = True
+            stack.append((first, farthest))
+            stack.append((farthest, last))
+    simplified = [p for p, k in zip(points, keep) if k]
+    if len(simplified) > MAX_POINTS:
+        step = (len(simplified) - 1) / (MAX_POINTS - 1)
+        simplified = [simplified[round(i * step)] for i in range(MAX_POINTS)]
+    return simplified
+
+
+def resample(points: List[Point], spacing: float = COMPARE_SPACING_M,
+             max_points: int = MAX_COMPARE_POINTS) -> List[Point]:
+    """Evenly spaced points along a projected path, at most ``max_points`` of them."""
+    lengths = [0.0]
+    for a, b in zip(points, points[1:]):
+        lengths.append(lengths[-1] + math.dist(a, b))
+    total = lengths[-1]
+    count = min(max_points, max(2, math.ceil(total / spacing) + 1))
+    if total == 0:
+        return [points[0]] * count
+    resampled = []
+    segment = 0
+    for k in range(count):
+        target = total * k / (count - 1)
+        while segment < len(points) - 2 and lengths[segment + 1] < target:
+            segment += 1
+        a, b = points[segment], points[segment + 1]
+        span = lengths[segment + 1] - lengths[segment]
+        t = (target - lengths[segment]) / span if span else 0.0
+        resampled.append((a[0] + (b[0] - a[0]) * t, a[1] + (b[1] - a[1]) * t))
+    return resampled
+
+
+def grid_signature(points: List[Point]) -> FrozenSet[Tuple[int, int]]:
+    """Grid cells a (lat, lng) path passes through, sampling long segments densely."""
+    cells = set()
+    for (lat1, lng1), (lat2, lng2) in zip(points, points[1:] or points):
+        steps = max(1, int(max(abs(lat2 - lat1), abs(lng2 - lng1)) / (CELL_DEGREES / 2)))
+        for s in range(steps + 1):
+            t = s / steps
+            cells.add((math.floor((lat1 + (lat2 - lat1) * t) / CELL_DEGREES),
+                       math.floor((lng1 + (lng2 - lng1) * t) / CELL_DEGREES)))
+    return frozenset(cells)
+
+
+def discrete_frechet(p: List[Point], q: List[Point], limit: float = math.inf) -> float:
+    """Discrete Fréchet distance between two projected paths, in meters.
+
+    Returns ``inf`` as soon as the distance is known to exceed ``limit``.
+    """
+    dist = math.dist
+    first = p[0]
+    previous = []
+    running = 0.0
+    for b in q:
+        running = max(running, dist(first, b))
+        previous.append(running)
+    for a in p[1:]:
+        current = [max(previous[0], dist(a, q[0]))]
+        for j in range(1, len(q)):
+            best = min(previous[j], previous[j - 1], current[j - 1])
+            d = dist(a, q[j])
+            current.append(best if best > d else d)
+        if min(current) > limit:
+            return math.inf
+        previous = current
+    return previous[-1]
+
+
+def hausdorff(p: List[Point], q: List[Point], limit: float = math.inf) -> float:
+    """Symmetric Hausdorff distance between two projected point sets, in meters.
+
+    Returns ``inf`` as soon as the distance is known to exceed ``limit``.
+    """
+    worst = 0.0
+    for a, b in ((p, q), (q, p)):
+        for x in a:
+            nearest = min(math.dist(x, y) for y in b)
+            if nearest > limit:
+                return math.inf
+            worst = max(worst, nearest)
+    return worst
+
+
+def bbox_lower_bound(p: List[Point], q: List[Point]) -> float:
+    """A lower bound of the Hausdorff (and so the Fréchet) distance from the paths' bounding boxes."""
+    bound = 0.0
+    for axis in (0, 1):
+        p_values = [point[axis] for point in p]
+        q_values = [point[axis] for point in q]
+        bound = max(bound, abs(min(p_values) - min(q_values)), abs(max(p_values) - max(q_values)))
+    return bound
+
+
+def refine(paths: List[dict], max_distance: float, metric: str) -> List[Optional[float]]:
+    """Distances from the first path to each of the others, ``None`` where over ``max_distance``.
+
+    ``paths`` are streams-style dicts (``{"path": {"data": [[x, y], ...]}}``) so
+    the work can run through ``run_stream_task``. Candidates are rejected by
+    cheap lower bounds (bounding boxes, and endpoints for Fréchet) before the
+    full distance is computed, and the full computation stops early once a
+    candidate cannot match.
+    """
+    query = [tuple(point) for point in paths[0]["path"]["data"]]
+    distances = []
+    for candidate in paths[1:]:
+        path = [tuple(point) for point in candidate["path"]["data"]]
+        distance = math.inf
+        if bbox_lower_bound(query, path) <= max_distance:
+            if metric == "hausdorff":
+                distance = hausdorff(query, path, max_distance)
+            else:
+                # Either direction counts as the same route
+                for oriented in (path, path[::-1]):
+                    if max(math.dist(query[0], oriented[0]), math.dist(query[-1], oriented[-1])) <= max_distance:
+                        distance = min(distance, discrete_frechet(query, oriented, min(distance, max_distance)))
+        distances.append(round(distance, 1) if distance <= max_distance else None)
+    return distances
+
+
+class RouteGeometry:
+    __slots__ = ("athlete_id", "polyline", "latlng", "signature")
+
+    def __init__(self, athlete_id: int, polyline: str, latlng: List[Point]) -> None:
+        self.athlete_id = athlete_id
+        self.polyline = polyline
+        self.latlng = latlng
+        self.signature = grid_signature(latlng)
+
+
+def prepare(latlng: List[Point]) -> List[Point]:
+    """Simplify a (lat, lng) path, returning the kept (lat, lng) points."""
+    projected = project(latlng)
+    kept = set(simplify(projected))
+    return [point for point, xy in zip(latlng, projected) if xy in kept]
+
+
+class RouteIndex:
+    """Simplified activity geometries with an inverted index from grid cell to activities.
+
+    Maintained from activity store changes. A query first collects activities
+    sharing enough grid cells with the query path, then ranks them by
+    discrete Fréchet (or Hausdorff) distance on the simplified paths.
+    """
+
+    def __init__(self) -> None:
+        self._geometries: Dict[int, RouteGeometry] = {}
+        self._cells: Dict[Tuple[int, Tuple[int, int]], Set[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._geometries)
+
+    def add(self, athlete_id: int, activity_id: int, polyline: str) -> None:
+        existing = self._geometries.get(activity_id)
+        if existing is not None and existing.polyline == polyline:
+            return
+        self.discard(activity_id)
+        latlng = decode_polyline(polyline)
+        if len(latlng) < 2:
+            return
+        geometry = RouteGeometry(athlete_id, polyline, prepare(latlng))
+        self._geometries[activity_id] = geometry
+        for cell in geometry.signature:
+            self._cells.setdefault((athlete_id, cell), set()).add(activity_id)
+
+    def discard(self, activity_id: int) -> None:
+        geometry = self._geometries.pop(activity_id, None)
+        if geometry is None:
+            return
+        for cell in geometry.signature:
+            ids = self._cells.get((geometry.athlete_id, cell))
+            if ids is not None:
+                ids.discard(activity_id)
+                if not ids:
+                    del self._cells[(geometry.athlete_id, cell)]
+
+    def geometry(self, activity_id: int) -> Optional[RouteGeometry]:
+        return self._geometries.get(activity_id)
+
+    def on_store_change(self, event: str, athlete_id: int, payload) -> None:
+        if event == "upsert":
+            if payload.summary_polyline:
+                self.add(athlete_id, payload.id, payload.summary_polyline)
+            else:
+                self.discard(payload.id)
+        elif event == "remove":
+            self.discard(payload)
+        elif event == "forget":
+            for activity_id in [a for a, g in self._geometries.items() if g.athlete_id == athlete_id]:
+                self.discard(activity_id)
+
+    def candidates(self, athlete_id: int, signature: FrozenSet, min_overlap: float) -> Dict[int, float]:
+        """Activities whose cell sets have a Jaccard similarity of at least ``min_overlap``."""
+        shared: Dict[int, int] = {}
+        for cell in signature:
+            for activity_id in self._cells.get((athlete_id, cell), ()):
+                shared[activity_id] = shared.get(activity_id, 0) + 1
+        overlaps = {}
+        for activity_id, count in shared.items():
+            other = len(self._geometries[activity_id].signature)
+            jaccard = count / (len(signature) + other - count)
+            if jaccard >= min_overlap:
+                overlaps[activity_id] = jaccard
+        return overlaps
+
+    def candidate_paths(self, athlete_id: int, latlng: List[Point], min_overlap: float = 0.5,
+                        exclude: int = None) -> Tuple[List[Point], Dict[int, float], List[List[Point]]]:
+        """The resampled query path, the overlapping activities and their resampled paths, in the same order.
+
+        Paths are projected around the query's first point so that they can be
+        compared in meters with ``refine``.
+        """
+        query = prepare(latlng)
+        overlaps = self.candidates(athlete_id, grid_signature(query), min_overlap)
+        overlaps.pop(exclude, None)
+        origin_lat = query[0][0]
+        paths = [resample(project(self._geometries[activity_id].latlng, origin_lat)) for activity_id in overlaps]
+        return resample(project(query, origin_lat)), overlaps, paths
+
+
+route_index = RouteIndex()
+activity_store.subscribe(route_index.on_store_change)
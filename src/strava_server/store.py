@@ -0,0 +1,80 @@
+from typing import Callable, Dict, List, Optional
+
+from .records import ActivityRecord
+
+
+class ActivityStore:
+    """Local copy of athletes' activity summaries, kept current by webhook events.
+
+    Activities are kept as compact ``ActivityRecord``s, grouped per athlete and
+    keyed by activity id. The store also remembers the last bearer token seen
+    for each athlete so that background jobs can refresh that athlete's data.
+
+    Derived indexes subscribe to changes with ``subscribe``; listeners are
+    called as ``listener(event, athlete_id, payload)`` where event is
+    ``"upsert"`` (payload: the record), ``"remove"`` (payload: the activity id)
+    or ``"forget"`` (payload: None).
+    """
+
+    def __init__(self) -> None:
+        self._activities: Dict[int, Dict[int, ActivityRecord]] = {}
+        self._tokens: Dict[int, str] = {}
+        self._listeners: List[Callable] = []
+
+    def subscribe(self, listener: Callable) -> None:
+        self._listeners.append(listener)
+
+    def _notify(self, event: str, athlete_id: int, payload=None) -> None:
+        for listener in self._listeners:
+            listener(event, athlete_id, payload)
+
+    def remember_token(self, athlete_id: int, token: str) -> None:
+        self._tokens[athlete_id] = token
+
+    def token_for(self, athlete_id: int) -> Optional[str]:
+        return self._tokens.get(athlete_id)
+
+    def ingest(self, token: str, activities: List[dict]) -> None:
+        """Upsert activity summaries returned for ``token``."""
+        for activity in activities:
+            athlete_id = activity.get("athlete", {}).get("id")
+            if athlete_id is None:
+                continue
+            self.remember_token(athlete_id, token)
+            self.upsert(athlete_id, activity)
+
+    def upsert(self, athlete_id: int, activity: dict) -> None:
+        record = ActivityRecord.from_summary(activity)
+        record.athlete_id = athlete_id
+        self._activities.setdefault(athlete_id, {})[record.id] = record
+        self._notify("upsert", athlete_id, record)
+
+    def update_fields(self, athlete_id: int, activity_id: int, updates: dict) -> None:
+        """Set record attributes of a stored activity; unknown fields are ignored."""
+        record = self._activities.get(athlete_id, {}).get(activity_id)
+        if record is None:
+            return
+        for key, value in updates.items():
+            if key in ActivityRecord.__slots__:
+                setattr(record, key, value)
+        self._notify("upsert", athlete_id, record)
+
+    def remove(self, athlete_id: int, activity_id: int) -> None:
+        if self._activities.get(athlete_id, {}).pop(activity_id, None) is not None:
+            self._notify("remove", athlete_id, activity_id)
+
+    def forget_athlete(self, athlete_id: int) -> Optional[str]:
+        """Drop everything known about an athlete and return their last token."""
+        self._activities.pop(athlete_id, None)
+        self._notify("forget", athlete_id)
+        return self._tokens.pop(athlete_id, None)
+
+    def get(self, athlete_id: int, activity_id: int) -> Optional[ActivityRecord]:
+        return self._activities.get(athlete_id, {}).get(activity_id)
+
+    def activities(self, athlete_id: int) -> List[ActivityRecord]:
+        """Stored activities for an athlete, newest first."""
+        return sorted(self._activities.get(athlete_id, {}).values(), key=lambda r: r.start, reverse=True)
+
+
+activity_store = ActivityStore()
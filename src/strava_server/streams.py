@@ -0,0 +1,176 @@
+from statistics import mean
+from typing import Dict, List, Optional
+
+# Stream types that are resampled alongside the grid axis
+RESAMPLED_KEYS = ("time", "distance", "heartrate", "watts")
+
+
+def interpolate(xs: List[float], ys: List[float], grid: List[float]) -> List[float]:
+    """Linearly interpolate ``ys`` sampled at ascending ``xs`` onto ascending ``grid``.
+
+    Both sequences are walked once, so the cost is O(len(xs) + len(grid)).
+    Grid points outside ``xs`` are clamped to the first/last sample. Where one
+    neighbouring sample is missing (``None``) the other is used; where both
+    are, the result is ``None``.
+    """
+    out = []
+    n = len(xs)
+    if n == 1:
+        return [ys[0]] * len(grid)
+    j = 0
+    for g in grid:
+        while j < n - 2 and xs[j + 1] < g:
+            j += 1
+        x0, x1 = xs[j], xs[j + 1]
+        y0, y1 = ys[j], ys[j + 1]
+        if g <= x0 or x1 == x0:
+            out.append(y0 if g <= x1 else y1)
+        elif g >= x1:
+            out.append(y1)
+        elif y0 is None or y1 is None:
+            out.append(y1 if y0 is None else y0)
+        else:
+            out.append(y0 + (y1 - y0) * (g - x0) / (x1 - x0))
+    return out
+
+
+def resample(streams: Dict[str, dict], axis: str, step: float, length: float) -> Dict[str, List[float]]:
+    """Resample key_by_type streams onto a uniform ``axis`` grid from 0 to ``length``."""
+    xs = streams[axis]["data"]
+    grid = [i * step for i in range(int(length // step) + 1)]
+    resampled = {axis: grid}
+    for key in RESAMPLED_KEYS:
+        if key != axis and streams.get(key, {}).get("data"):
+            resampled[key] = interpolate(xs, streams[key]["data"], grid)
+    return resampled
+
+
+def split_summaries(resampled: Dict[str, List[float]], points_per_split: int) -> List[Dict[str, Optional[float]]]:
+    """Pace (s/km), mean heart rate and mean power for consecutive grid splits."""
+    times = resampled["time"]
+    distances = resampled["distance"]
+    splits = []
+    for start in range(0, len(times) - 1, points_per_split):
+        end = min(start + points_per_split, len(times) - 1)
+        elapsed = times[end] - times[start]
+        covered = distances[end] - distances[start]
+        split = {"pace": elapsed / covered * 1000 if covered > 0 else None}
+        for key in ("heartrate", "watts"):
+            # Dropouts are left out of the mean rather than counted as zero
+            values = [v for v in (resampled.get(key) or [])[start:end + 1] if v is not None]
+            split[key] = mean(values) if values else None
+        splits.append(split)
+    return splits
+
+
+def aligned_split_summaries(all_streams: List[Dict[str, dict]], axis: str, step: float, length: float,
+                            points_per_split: int) -> List[List[Dict[str, Optional[float]]]]:
+    """Resample several activities onto the same grid and summarise each one's splits."""
+    return [split_summaries(resample(streams, axis, step, length), points_per_split) for streams in all_streams]
+
+
+def hr_efficiency(streams: Dict[str, dict]) -> Dict[str, float]:
+    """Average heart rate, average speed (km/h) and speed per heartbeat over an activity."""
+    avg_hr = mean(streams["heartrate"]["data"])
+    avg_speed = mean(streams["velocity_smooth"]["data"]) * 3.6
+    return {"avg_hr": avg_hr, "avg_speed_kmh": avg_speed, "efficiency": avg_speed / avg_hr}
+
+
+def compare_splits(per_activity: List[List[Dict[str, Optional[float]]]]) -> List[dict]:
+    """Line up split summaries of several activities with deltas against the first."""
+    rows = []
+    for index in range(min(len(splits) for splits in per_activity)):
+        row = {"split": index + 1}
+        for key in ("pace", "heartrate", "watts"):
+            values = [splits[index][key] for splits in per_activity]
+            if all(v is None for v in values):
+                continue
+            base = values[0]
+            row[key] = [round(v, 1) if v is not None else None for v in values]
+            row[f"{key}_delta"] = [round(v - base, 1) if v is not None and base is not None else None
+                                   for v in values]
+        rows.append(row)
+    return rows
+
+
+# Stream types tried, in order, as the signal whose shape downsampling preserves
+SHAPE_KEYS = ("watts", "heartrate", "velocity_smooth", "altitude", "cadence", "distance")
+DOWNSAMPLE_METHODS = ("lttb", "minmax")
+
+
+def lttb_indices(xs: List[float], ys: List[float], threshold: int) -> List[int]:
+    """Indices kept by largest-triangle-three-buckets downsampling to ``threshold`` points."""
+    n = len(ys)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+    indices = [0]
+    bucket_size = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        # Average of the next bucket is the third triangle vertex
+        count = next_end - end
+        avg_x = sum(xs[end:next_end]) / count
+        avg_y = sum(ys[end:next_end]) / count
+        ax, ay = xs[a], ys[a]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        indices.append(best)
+        a = best
+    indices.append(n - 1)
+    return indices
+
+
+def minmax_indices(ys: List[float], threshold: int) -> List[int]:
+    """Indices of the minimum and maximum of each bucket, keeping first and last samples."""
+    n = len(ys)
+    if threshold >= n or threshold < 4:
+        return list(range(n))
+    buckets = (threshold - 2) // 2
+    bucket_size = (n - 2) / buckets
+    indices = {0, n - 1}
+    for i in range(buckets):
+        start = int(i * bucket_size) + 1
+        end = max(int((i + 1) * bucket_size) + 1, start + 1)
+        bucket = range(start, min(end, n - 1))
+        if not bucket:
+            continue
+        indices.add(min(bucket, key=ys.__getitem__))
+        indices.add(max(bucket, key=ys.__getitem__))
+    return sorted(indices)
+
+
+def downsample(streams: Dict[str, dict], max_points: int, method: str = "lttb") -> Dict[str, dict]:
+    """Reduce key_by_type streams to at most ``max_points`` samples.
+
+    One set of sample indices is chosen from the most informative stream and
+    applied to every stream, so ``time``, ``distance`` and ``latlng`` stay
+    aligned.
+    """
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"downsample_method must be one of {', '.join(DOWNSAMPLE_METHODS)}")
+    shape_key = next((k for k in SHAPE_KEYS if streams.get(k, {}).get("data")), None)
+    if shape_key is None:
+        return streams
+    ys = streams[shape_key]["data"]
+    if len(ys) <= max_points:
+        return streams
+    if method == "minmax":
+        indices = minmax_indices(ys, max_points)
+    else:
+        xs = streams.get("time", {}).get("data") or streams.get("distance", {}).get("data") or range(len(ys))
+        indices = lttb_indices(list(xs), ys, max_points)
+
+    reduced = {}
+    for key, stream in streams.items():
+        data = stream.get("data") if isinstance(stream, dict) else None
+        if not data or len(data) != len(ys):
+            reduced[key] = stream
+            continue
+        reduced[key] = {**stream, "data": [data[i] for i in indices], "resolution": "downsampled"}
+    return reduced
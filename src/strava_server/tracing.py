@@ -0,0 +1,132 @@
+"""
+Optional span tracing of request phases.
+
+Set ``STRAVA_TRACING`` to enable it:
+
+* ``console`` - print finished spans as JSON lines to stderr
+* ``file:<path>`` - append finished spans as JSON lines to ``<path>``
+* ``otel`` - hand spans to the OpenTelemetry API (configure the SDK/exporter yourself)
+
+Spans use OpenTelemetry field names (trace/span ids, parent span id,
+start/end time in unix nanoseconds, attributes). When tracing is disabled
+``span`` returns a shared no-op context manager and routes are not wrapped.
+"""
+import functools
+import json
+import logging
+import os
+import secrets
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+from fastapi.routing import APIRoute
+
+logger = logging.getLogger(__name__)
+
+TRACING = os.getenv("STRAVA_TRACING", "")
+TRACING_ENABLED = bool(TRACING)
+
+_NOOP = nullcontext()
+_current: ContextVar[Optional[dict]] = ContextVar("current_span", default=None)
+_otel_tracer = None
+if TRACING == "otel":
+    try:
+        from opentelemetry import trace as _otel_trace
+        _otel_tracer = _otel_trace.get_tracer("strava_server")
+    except ImportError:
+        logger.warning("STRAVA_TRACING=otel needs the opentelemetry-api package; tracing disabled")
+        TRACING_ENABLED = False
+
+
+def _export(record: dict) -> None:
+    line = json.dumps(record)
+    if TRACING.startswith("file:"):
+        with open(TRACING[5:], "a") as f:
+            f.write(line + "\n")
+    else:
+        print(line, file=sys.stderr)
+
+
+@contextmanager
+def _span(name: str, attributes: dict):
+    parent = _current.get()
+    record = {
+        "name": name,
+        "trace_id": parent["trace_id"] if parent else secrets.token_hex(16),
+        "span_id": secrets.token_hex(8),
+        "parent_span_id": parent["span_id"] if parent else None,
+        "start_time_unix_nano": time.time_ns(),
+        "attributes": attributes,
+        "status": "OK",
+    }
+    reset = _current.set(record)
+    try:
+        yield record
+    except BaseException as exc:
+        record["status"] = "ERROR"
+        record["attributes"]["exception.type"] = type(exc).__name__
+        raise
+    finally:
+        _current.reset(reset)
+        record["end_time_unix_nano"] = time.time_ns()
+        _export(record)
+
+
+def span(name: str, **attributes):
+    """Context manager timing one phase of a request."""
+    if not TRACING_ENABLED:
+        return _NOOP
+    if _otel_tracer is not None:
+        return _otel_tracer.start_as_current_span(name, attributes=attributes)
+    return _span(name, attributes)
+
+
+def set_attribute(name: str, value) -> None:
+    """Attach an attribute to the innermost open span."""
+    if not TRACING_ENABLED:
+        return
+    if _otel_tracer is not None:
+        _otel_trace.get_current_span().set_attribute(name, value)
+        return
+    current = _current.get()
+    if current is not None:
+        current["attributes"][name] = value
+
+
+def traced(name: str) -> Callable:
+    """Decorator wrapping an async function in a span, or returning it unchanged when tracing is off."""
+    def decorate(func):
+        if not TRACING_ENABLED:
+            return func
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with span(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class TracedRoute(APIRoute):
+    """Route class adding a ``route`` span around FastAPI's request handling and a
+    ``handler`` span around the endpoint function. Their difference is the time
+    spent validating parameters, validating the response model and encoding it."""
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs) -> None:
+        if TRACING_ENABLED:
+            endpoint = traced("handler")(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        if not TRACING_ENABLED:
+            return handler
+        operation_id = self.operation_id or self.name
+
+        async def traced_handler(request):
+            with span("route", operation_id=operation_id, path=self.path):
+                return await handler(request)
+        return traced_handler
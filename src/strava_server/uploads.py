@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException
+
+from .cache import response_cache
+from .utils import make_strava_request
+
+logger = logging.getLogger(__name__)
+
+# Uploads read files from this directory only; the feature is disabled when unset
+UPLOAD_DIR = os.getenv("STRAVA_UPLOAD_DIR")
+UPLOAD_CONCURRENCY = int(os.getenv("STRAVA_UPLOAD_CONCURRENCY", "4"))
+POLL_INITIAL_DELAY = 1.0
+POLL_MAX_DELAY = 30.0
+# Give up waiting for Strava to process an upload after this many seconds
+POLL_TIMEOUT = float(os.getenv("STRAVA_UPLOAD_POLL_TIMEOUT", "600"))
+MAX_JOBS = 100
+
+DATA_TYPES = ("fit", "fit.gz", "tcx", "tcx.gz", "gpx", "gpx.gz")
+
+
+def data_type_for(path: Path) -> Optional[str]:
+    """Strava ``data_type`` from a file name (``ride.fit.gz`` -> ``fit.gz``)."""
+    name = path.name.lower()
+    for data_type in sorted(DATA_TYPES, key=len, reverse=True):
+        if name.endswith("." + data_type):
+            return data_type
+    return None
+
+
+def resolve_upload_path(relative: str) -> Path:
+    """Absolute path of a file inside UPLOAD_DIR, refusing anything outside it."""
+    if not UPLOAD_DIR:
+        raise HTTPException(status_code=503, detail="Uploads are disabled; set STRAVA_UPLOAD_DIR")
+    root = Path(UPLOAD_DIR).resolve()
+    path = (root / relative).resolve()
+    if not path.is_relative_to(root):
+        raise HTTPException(status_code=400, detail=f"'{relative}' is outside the upload directory")
+    if not path.is_file():
+        raise HTTPException(status_code=404, detail=f"'{relative}' not found")
+    if data_type_for(path) is None:
+        raise HTTPException(status_code=400, detail=f"'{relative}' is not one of: {', '.join(DATA_TYPES)}")
+    return path
+
+
+class UploadFile:
+    """Progress of one file: queued -> uploading -> processing -> ready or error."""
+
+    def __init__(self, name: str, path: Path) -> None:
+        self.name = name
+        self.path = path
+        self.size = path.stat().st_size
+        self.state = "queued"
+        self.upload_id: Optional[int] = None
+        self.activity_id: Optional[int] = None
+        self.error: Optional[str] = None
+        self.polls = 0
+
+    def to_dict(self) -> Dict:
+        return {"file": self.name, "bytes": self.size, "state": self.state, "upload_id": self.upload_id,
+                "activity_id": self.activity_id, "error": self.error, "polls": self.polls}
+
+
+class UploadJob:
+    def __init__(self, token: str, files: List[UploadFile], options: Dict) -> None:
+        self.id = uuid.uuid4().hex[:12]
+        self.token = token
+        self.files = files
+        self.options = options
+        self.created = time.time()
+
+    @property
+    def done(self) -> bool:
+        return all(f.state in ("ready", "error") for f in self.files)
+
+    def to_dict(self) -> Dict:
+        counts: Dict[str, int] = {}
+        for f in self.files:
+            counts[f.state] = counts.get(f.state, 0) + 1
+        return {"job_id": self.id, "done": self.done, "counts": counts, "files": [f.to_dict() for f in self.files]}
+
+
+class UploadManager:
+    """Runs upload jobs in the background and keeps their per-file progress.
+
+    At most UPLOAD_CONCURRENCY files are sent to Strava at a time across all
+    jobs. Each file is streamed from disk as multipart data; once Strava
+    accepts it, its processing status is polled with exponential backoff
+    outside the upload pool, so slow processing does not hold up other files.
+    """
+
+    def __init__(self, concurrency: int = UPLOAD_CONCURRENCY) -> None:
+        self._jobs: "OrderedDict[str, UploadJob]" = OrderedDict()
+        self._pool = asyncio.Semaphore(concurrency)
+        self._tasks = set()
+
+    def submit(self, token: str, paths: List[str], options: Dict) -> UploadJob:
+        files = [UploadFile(relative, resolve_upload_path(relative)) for relative in paths]
+        job = UploadJob(token, files, options)
+        self._jobs[job.id] = job
+        self._evict()
+        for upload in files:
+            task = asyncio.ensure_future(self._process(job, upload))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return job
+
+    def _evict(self) -> None:
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.done][:max(0, len(self._jobs) - MAX_JOBS)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str, token: str) -> Optional[UploadJob]:
+        job = self._jobs.get(job_id)
+        # Jobs are only visible to the token that created them
+        if job is None or job.token != token:
+            return None
+        return job
+
+    async def _process(self, job: UploadJob, upload: UploadFile) -> None:
+        try:
+            async with self._pool:
+                upload.state = "uploading"
+                status = await self._send(job, upload)
+            upload.upload_id = status.get("id")
+            upload.state = "processing"
+            await self._poll(job, upload, status)
+        except HTTPException as exc:
+            upload.state, upload.error = "error", str(exc.detail)
+        except Exception as exc:
+            logger.warning("Upload of %s failed: %s", upload.name, exc)
+            upload.state, upload.error = "error", str(exc)
+
+    async def _send(self, job: UploadJob, upload: UploadFile) -> Dict:
+        data = {"data_type": data_type_for(upload.path), "external_id": f"{job.id}-{upload.path.name}"}
+        data.update({key: value for key, value in job.options.items() if value is not None})
+        # httpx reads the open file in chunks while sending, so it is never held in memory whole
+        with upload.path.open("rb") as fh:
+            response = await make_strava_request("POST", "/uploads", job.token, data=data,
+                                                 files={"file": (upload.path.name, fh)})
+        return response.json()
+
+    async def _poll(self, job: UploadJob, upload: UploadFile, status: Dict) -> None:
+        delay = POLL_INITIAL_DELAY
+        deadline = time.monotonic() + POLL_TIMEOUT
+        while True:
+            if status.get("error"):
+                upload.state, upload.error = "error", status["error"]
+                return
+            if status.get("activity_id"):
+                upload.activity_id = status["activity_id"]
+                upload.state = "ready"
+                response_cache.invalidate("/athlete/activities", token=job.token)
+                return
+            if time.monotonic() + delay > deadline:
+                upload.state, upload.error = "error", "Timed out waiting for Strava to process the upload"
+                return
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, POLL_MAX_DELAY)
+            upload.polls += 1
+            try:
+                response = await make_strava_request("GET", f"/uploads/{upload.upload_id}", job.token)
+            except HTTPException as exc:
+                # Rate limiting and upstream failures are retried on the next poll
+                if exc.status_code == 429 or exc.status_code >= 500:
+                    continue
+                raise
+            status = response.json()
+
+
+upload_manager = UploadManager()
@@ -1,30 +1,54 @@
 from fastapi import HTTPException
+import asyncio
 import httpx
 import os
+import time
+from collections import deque
+
+from . import recording
+from .admission import upstream_admission
+from .cache import ACTIVITY_TTL, response_cache
+from .resilience import UPSTREAM_TIMEOUT, breaker_for, endpoint_group, hedged, mark_stale
+from .tracing import set_attribute, span
 
 STRAVA_BASE_URL = "https://www.strava.com/api/v3"
 
+# Most items a paginated listing collects in one call, whatever the requested limit
+PAGINATE_MAX_ITEMS = int(os.getenv("STRAVA_PAGINATE_MAX_ITEMS", "2000"))
+
+ACTIVITY_STREAM_KEYS = ["time", "distance", "latlng", "altitude", "velocity_smooth",
+                        "heartrate", "cadence", "watts", "temp", "moving", "grade_smooth"]
+
 def extract_bearer_token(authorization: str) -> str:
     """Extract bearer token from Authorization header"""
-    if not authorization:
-        raise HTTPException(
-            status_code=401, 
-            detail="Authorization header is required"
-        )
+    with span("auth.extract_token"):
+        if not authorization:
+            raise HTTPException(
+                status_code=401, 
+                detail="Authorization header is required"
+            )
     
-    if not authorization.startswith("Bearer "):
-        raise HTTPException(
-            status_code=401, 
-            detail="Authorization header must start with 'Bearer '"
-        )
+        if not authorization.startswith("Bearer "):
+            raise HTTPException(
+                status_code=401, 
+                detail="Authorization header must start with 'Bearer '"
+            )
     
-    token = authorization[7:]
-    if not token:
-        raise HTTPException(
-            status_code=401, 
-            detail="Bearer token is required"
-        )
+        token = authorization[7:]
+        if not token:
+            raise HTTPException(
+                status_code=401, 
+                detail="Bearer token is required"
+            )
     
+        return token
+
+def resolve_token(token: str = None) -> str:
+    """Fall back to the STRAVA_ACCESS_TOKEN environment variable when no token is given"""
+    if token is None:
+        token = os.getenv("STRAVA_ACCESS_TOKEN")
+        if token is None:
+            raise Exception("Please set the access_token for strava either via request headers or as environment variable")
     return token
 
 async def make_strava_request(
@@ -35,23 +59,175 @@ async def make_strava_request(
     data: dict = None,
     files: dict = None
 ):
-    if token is None:
-        token = os.getenv("STRAVA_ACCESS_TOKEN")
-        if token is None:
-            raise Exception("Please set the access_token for strava either via request headers or as environment variable")
-        
+    token = resolve_token(token)
     headers = {"authorization": f"Bearer {token}"}
     url = f"{STRAVA_BASE_URL}{endpoint}"
-    async with httpx.AsyncClient() as client:
-        if method.upper() == "GET":
-            response = await client.get(url, headers=headers, params=params)
-        elif method.upper() == "POST":
-            response = await client.post(url, headers=headers, data=data, files=files)
-        elif method.upper() == "PUT":
-            response = await client.put(url, headers=headers, data=data)
-        else:
-            raise HTTPException(status_code=405, detail="Method not allowed")
-    
+    method = method.upper()
+    if method not in ("GET", "POST", "PUT"):
+        raise HTTPException(status_code=405, detail="Method not allowed")
+
+    async def request():
+        if recording.replay is not None:
+            return await recording.replay.respond(method, url, endpoint, params)
+        async with httpx.AsyncClient(timeout=UPSTREAM_TIMEOUT) as client:
+            if method == "GET":
+                return await client.get(url, headers=headers, params=params)
+            elif method == "POST":
+                return await client.post(url, headers=headers, data=data, files=files)
+            return await client.put(url, headers=headers, data=data)
+
+    async def send():
+        # Each attempt is timed on its own so a hedged winner records its own latency
+        started = time.monotonic()
+        return await request(), time.monotonic() - started
+
+    breaker = breaker_for(endpoint)
+    # Queue for admission first so a half-open trial is not held while waiting
+    async with upstream_admission.slot(token):
+        is_trial = breaker.state == "half-open"
+        if not breaker.allow():
+            raise HTTPException(status_code=503, detail="Strava is failing for this endpoint; retry shortly")
+        try:
+            with span("strava.request", method=method, endpoint_group=endpoint_group(endpoint)):
+                # Only idempotent reads are hedged; a replayed exchange is answered exactly once
+                hedge = method == "GET" and recording.replay is None
+                response, elapsed = await (hedged(send) if hedge else send())
+                if recording.recorder is not None:
+                    recording.recorder.upstream(method, endpoint, token, params, response, elapsed)
+        except httpx.TimeoutException:
+            breaker.record_failure()
+            raise HTTPException(status_code=504, detail="Strava did not respond in time")
+        except httpx.TransportError as exc:
+            breaker.record_failure()
+            raise HTTPException(status_code=502, detail=f"Could not reach Strava: {exc}")
+        finally:
+            # Cancellation or any other error must not leave the trial slot taken
+            if is_trial:
+                breaker.release_trial()
+
+    if response.status_code >= 500:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
     if response.status_code >= 400:
         raise HTTPException(status_code=response.status_code, detail=response.text)
     return response
+
+_revalidating = {}
+
+async def refresh_cached(key: tuple, endpoint: str, token: str, params: dict, ttl: float):
+    """GET an endpoint and store the decoded body in the response cache under ``key``."""
+    response = await make_strava_request("GET", endpoint, token, params=params)
+    with span("json.decode", bytes=len(response.content)):
+        body = response.json()
+    response_cache.set(key, body, ttl)
+    return body
+
+def revalidate_cached(key: tuple, endpoint: str, token: str, params: dict, ttl: float) -> None:
+    """Refresh a cache entry in the background, once per key at a time."""
+    if key in _revalidating:
+        return
+    def done(task):
+        _revalidating.pop(key, None)
+        # Failures leave the stale entry in place; retrieve them so they are not reported as unhandled
+        if not task.cancelled():
+            task.exception()
+
+    task = asyncio.ensure_future(refresh_cached(key, endpoint, token, params, ttl))
+    _revalidating[key] = task
+    task.add_done_callback(done)
+
+async def fetch_json(endpoint: str, token: str = None, params: dict = None, ttl: float = None):
+    """GET an endpoint and return the decoded body, served from the response cache when fresh.
+
+    Expired entries are served immediately while they are refreshed in the
+    background (stale-while-revalidate), and are used as a fallback when
+    Strava fails. Serving stale data is recorded with ``mark_stale``.
+    """
+    token = resolve_token(token)
+    with span("cache.lookup", endpoint_group=endpoint_group(endpoint)):
+        key = response_cache.make_key(endpoint, token, params)
+        cached = response_cache.get(key)
+        set_attribute("hit", cached is not None)
+    if cached is not None:
+        return cached
+
+    stale = response_cache.get_stale(key)
+    if stale is not None:
+        body, age = stale
+        if breaker_for(endpoint).state != "open":
+            revalidate_cached(key, endpoint, token, params, ttl)
+        mark_stale(age)
+        return body
+
+    return await refresh_cached(key, endpoint, token, params, ttl)
+
+async def fetch_streams(endpoint: str, token: str = None, keys: list = None, all_keys: list = None,
+                        ttl: float = ACTIVITY_TTL):
+    """Fetch every stream type for a resource once and return the requested ones.
+
+    Streams are always requested with the full key set so that one cached
+    upstream response serves any later combination of ``keys``.
+    """
+    all_keys = all_keys or ACTIVITY_STREAM_KEYS
+    streams = await fetch_json(endpoint, token, params={"keys": ",".join(all_keys), "key_by_type": "true"}, ttl=ttl)
+    if not keys:
+        return streams
+    wanted = {str(getattr(k, "value", k)) for k in keys}
+    return {k: v for k, v in streams.items() if k in wanted}
+
+async def fetch_all_pages(endpoint: str, token: str = None, params: dict = None, limit: int = None,
+                          per_page: int = None, max_items: int = PAGINATE_MAX_ITEMS, concurrency: int = 4,
+                          size_param: str = "per_page", cursor_param: str = None, cursor_field: str = "cursor",
+                          ttl: float = None) -> list:
+    """Collect the items of a paginated list endpoint into one list, in page order.
+
+    Numbered pages are fetched ahead of the one being read, up to
+    ``concurrency`` at a time, once the first page turns out to be full.
+    Cursor-based endpoints (``cursor_param`` set to the ``cursor_field`` of
+    the previous page's last item) can only be walked one page at a time.
+    Collection stops at the first short page, after ``limit`` items, or after
+    ``max_items`` items so that one call cannot grow without bound.
+    """
+    cap = min(limit, max_items) if limit else max_items
+    per_page = per_page or min(200, cap)
+    items = []
+
+    if cursor_param:
+        cursor = None
+        while len(items) < cap:
+            page_params = {**(params or {}), size_param: per_page}
+            if cursor is not None:
+                page_params[cursor_param] = cursor
+            page_items = await fetch_json(endpoint, token, params=page_params, ttl=ttl)
+            items.extend(page_items)
+            cursor = page_items[-1].get(cursor_field) if page_items else None
+            if len(page_items) < per_page or cursor is None:
+                break
+        return items[:cap]
+
+    def fetch(page: int) -> asyncio.Future:
+        page_params = {**(params or {}), size_param: per_page, "page": page}
+        return asyncio.ensure_future(fetch_json(endpoint, token, params=page_params, ttl=ttl))
+
+    max_pages = -(-cap // per_page)
+    next_page = 1
+    pending = deque()
+    try:
+        while True:
+            # Only the first page is requested alone, so short lists cost one call
+            while next_page <= max_pages and len(pending) < (concurrency if next_page > 2 else 1):
+                pending.append(fetch(next_page))
+                next_page += 1
+            if not pending:
+                break
+            page_items = await pending.popleft()
+            items.extend(page_items)
+            if len(page_items) < per_page:
+                break
+    finally:
+        for task in pending:
+            task.cancel()
+        # Collect pages fetched past the end so their errors are not reported as unhandled
+        await asyncio.gather(*pending, return_exceptions=True)
+    return items[:cap]
@@ -0,0 +1,82 @@
+from bisect import bisect_right
+from typing import Dict, List, Optional
+
+# Gaps longer than this (auto-pause, lost signal) are not counted as time in a zone
+MAX_SAMPLE_GAP = 30
+
+
+def zone_bounds(zones: List[dict]) -> List[float]:
+    """Lower bounds of Strava zone ranges (``[{"min": .., "max": ..}, ...]``)."""
+    return [zone["min"] for zone in zones]
+
+
+def time_in_zones(times: List[float], values: List[Optional[float]], bounds: List[float]) -> List[float]:
+    """Seconds spent in each zone, weighting every sample by the time until the next one.
+
+    Samples that are ``None`` or below the first bound are ignored.
+    """
+    seconds = [0.0] * len(bounds)
+    lowest = bounds[0]
+    for i in range(len(times) - 1):
+        value = values[i]
+        if value is None or value < lowest:
+            continue
+        dt = times[i + 1] - times[i]
+        if 0 < dt <= MAX_SAMPLE_GAP:
+            seconds[bisect_right(bounds, value) - 1] += dt
+    return seconds
+
+
+def add_seconds(total: List[float], seconds: List[float]) -> List[float]:
+    return [a + b for a, b in zip(total, seconds)] if total else list(seconds)
+
+
+def describe_zones(zones: List[dict], seconds: List[float]) -> List[dict]:
+    """Zone ranges with the time spent in each, as returned to clients."""
+    total = sum(seconds)
+    return [
+        {
+            "zone": index + 1,
+            "min": zone["min"],
+            "max": zone["max"],
+            "seconds": round(spent),
+            "percent": round(spent / total * 100, 1) if total else 0.0,
+        }
+        for index, (zone, spent) in enumerate(zip(zones, seconds))
+    ]
+
+
+def athlete_zone_sets(athlete_zones: dict) -> Dict[str, List[dict]]:
+    """Map stream type to the athlete's zones for it, from ``/athlete/zones``."""
+    zone_sets = {}
+    heart_rate = (athlete_zones.get("heart_rate") or {}).get("zones")
+    if heart_rate:
+        zone_sets["heartrate"] = heart_rate
+    power = (athlete_zones.get("power") or {}).get("zones")
+    if power:
+        zone_sets["watts"] = power
+    return zone_sets
+
+
+def activity_time_in_zones(streams: Dict[str, dict], zone_sets: Dict[str, List[dict]]) -> Dict[str, List[float]]:
+    """Seconds per zone for every stream type that has both data and athlete zones."""
+    times = streams.get("time", {}).get("data")
+    if not times:
+        return {}
+    result = {}
+    for key, zones in zone_sets.items():
+        values = streams.get(key, {}).get("data")
+        if values:
+            result[key] = time_in_zones(times, values, zone_bounds(zones))
+    return result
+
+
+def pace_zone_seconds(streams: Dict[str, dict], bounds: List[float]) -> List[float]:
+    """Seconds per speed zone, ignoring samples where the athlete stood still."""
+    speeds = [s if s > 0 else None for s in streams["velocity_smooth"]["data"]]
+    return time_in_zones(streams["time"]["data"], speeds, bounds)
+
+
+def many_time_in_zones(all_streams: List[Dict[str, dict]], zone_sets: Dict[str, List[dict]]) -> List[Dict[str, List[float]]]:
+    """``activity_time_in_zones`` for several activities in one call."""
+    return [activity_time_in_zones(streams, zone_sets) for streams in all_streams]
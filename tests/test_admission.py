@@ -0,0 +1,90 @@
+import asyncio
+
+from strava_server.admission import FairScheduler
+
+
+def test_per_token_limit_holds_back_only_that_token():
+    scheduler = FairScheduler("test", capacity=4, per_token=1)
+    running = {"a": 0, "b": 0}
+    peak = {"a": 0, "b": 0}
+
+    async def hold(token):
+        async with scheduler.slot(token):
+            running[token] += 1
+            peak[token] = max(peak[token], running[token])
+            await asyncio.sleep(0.01)
+            running[token] -= 1
+
+    async def main():
+        await asyncio.gather(*(hold(token) for token in "aaab"))
+
+    asyncio.run(main())
+    assert peak == {"a": 1, "b": 1}
+    assert scheduler.metrics()["in_flight"] == 0
+    assert scheduler.admitted == 4
+
+
+def test_busy_token_does_not_starve_another():
+    scheduler = FairScheduler("test", capacity=1, per_token=1)
+    order = []
+
+    async def hold(token, name):
+        async with scheduler.slot(token):
+            order.append(name)
+            await asyncio.sleep(0)
+
+    async def main():
+        release = asyncio.Event()
+
+        async def first():
+            async with scheduler.slot("a"):
+                order.append("a0")
+                await release.wait()
+
+        holder = asyncio.create_task(first())
+        await asyncio.sleep(0)
+        tasks = [asyncio.create_task(hold("a", f"a{i}")) for i in range(1, 4)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(hold("b", "b1")))
+        await asyncio.sleep(0)
+        assert scheduler.metrics()["waiting"] == 4
+        release.set()
+        await asyncio.gather(holder, *tasks)
+
+    asyncio.run(main())
+    assert order.index("b1") < order.index("a2")
+
+
+def test_cancelled_waiter_leaves_no_slot_or_queue_entry():
+    scheduler = FairScheduler("test", capacity=1, per_token=1)
+
+    async def main():
+        release = asyncio.Event()
+
+        async def first():
+            async with scheduler.slot("a"):
+                await release.wait()
+
+        async def wait_for_slot():
+            async with scheduler.slot("b"):
+                raise AssertionError("cancelled waiter was admitted")
+
+        holder = asyncio.create_task(first())
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(wait_for_slot())
+        await asyncio.sleep(0)
+        assert scheduler.metrics()["waiting"] == 1
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert scheduler._waiters == []
+        release.set()
+        await holder
+
+        assert scheduler.metrics()["in_flight"] == 0
+        assert scheduler.metrics()["tokens"] == {}
+        async with scheduler.slot("c"):
+            assert scheduler.metrics()["in_flight"] == 1
+
+    asyncio.run(main())
+    assert scheduler._running == {}
+    assert scheduler._last_tag == {}
@@ -0,0 +1,21 @@
+import httpx
+from fastapi.testclient import TestClient
+
+from strava_server import server
+from strava_server.cache import response_cache
+from strava_server.routers import api
+
+TOKEN = "api-test-token"
+
+
+def test_athlete_update_invalidates_cached_athlete(monkeypatch):
+    async def put_request(method, endpoint, token=None, **kwargs):
+        return httpx.Response(200, json={"id": 1, "resource_state": 3, "weight": 70.0})
+
+    monkeypatch.setattr(api, "make_strava_request", put_request)
+    key = response_cache.make_key("/athlete", TOKEN)
+    response_cache.set(key, {"id": 1, "resource_state": 3, "weight": 80.0})
+    response = TestClient(server.app).put("/athlete", params={"weight": 70},
+                                          headers={"Authorization": f"Bearer {TOKEN}"})
+    assert response.status_code == 200
+    assert response_cache.get(key) is None
@@ -0,0 +1,76 @@
+import asyncio
+import calendar
+import time
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from strava_server import backfill
+from strava_server.backfill import Backfill, read_activities
+from strava_server.ratelimit import RateBudget
+from strava_server.store import activity_store
+
+ATHLETE_ID = 5001
+# Newest first, as Strava lists them
+ACTIVITIES = [{"id": 100 - i, "athlete": {"id": ATHLETE_ID}, "name": f"Ride {i}", "type": "Ride",
+               "start_date": f"2026-09-{20 - i:02d}T08:00:00Z", "distance": 1000.0, "moving_time": 600}
+              for i in range(5)]
+
+
+def epoch(activity: dict) -> int:
+    return calendar.timegm(time.strptime(activity["start_date"], "%Y-%m-%dT%H:%M:%SZ"))
+
+
+@pytest.fixture
+def strava(monkeypatch):
+    """Fake Strava listing two activities per page; ``fail_at`` list requests fail with a 503."""
+    state = {"requests": [], "fail_at": None}
+
+    async def make_strava_request(method, endpoint, token=None, params=None, **kwargs):
+        state["requests"].append((endpoint, dict(params or {})))
+        if endpoint != "/athlete/activities":
+            return httpx.Response(200, json={"id": int(endpoint.rsplit("/", 1)[1])})
+        listed = sum(1 for e, _ in state["requests"] if e == endpoint)
+        if listed == state["fail_at"]:
+            raise HTTPException(status_code=503, detail="Strava is down")
+        before = params.get("before")
+        older = [a for a in ACTIVITIES if before is None or epoch(a) < before]
+        return httpx.Response(200, json=older[:2])
+
+    monkeypatch.setattr(backfill, "make_strava_request", make_strava_request)
+    monkeypatch.setattr(backfill, "PAGE_SIZE", 2)
+    yield state
+    activity_store.forget_athlete(ATHLETE_ID)
+
+
+def run(data_dir) -> dict:
+    job = Backfill(str(data_dir), "tok", details=True, budget=RateBudget(10000, per=1))
+    return asyncio.run(job.run())
+
+
+def test_interrupted_backfill_resumes_from_saved_cursor(tmp_path, strava):
+    strava["fail_at"] = 2
+    with pytest.raises(HTTPException):
+        run(tmp_path)
+    first_run = strava["requests"]
+    assert [endpoint for endpoint, _ in first_run] == \
+        ["/athlete/activities", "/activities/100", "/activities/99", "/athlete/activities"]
+    saved = Backfill(str(tmp_path), "tok").load_checkpoint()
+    assert saved == {"before": epoch(ACTIVITIES[1]), "pages": 1, "activities": 2, "complete": False}
+
+    strava["requests"], strava["fail_at"] = [], None
+    checkpoint = run(tmp_path)
+
+    lists = [params for endpoint, params in strava["requests"] if endpoint == "/athlete/activities"]
+    assert lists[0] == {"per_page": 2, "before": epoch(ACTIVITIES[1])}
+    assert len(lists) == 3
+    details = [endpoint for endpoint, _ in strava["requests"] if endpoint != "/athlete/activities"]
+    assert details == ["/activities/98", "/activities/97", "/activities/96"]
+    assert checkpoint == {"before": epoch(ACTIVITIES[4]), "pages": 3, "activities": 5, "complete": True}
+    assert [a["id"] for a in read_activities(str(tmp_path))] == [a["id"] for a in ACTIVITIES]
+    assert (tmp_path / "activities.jsonl").read_text().count("\n") == 5
+
+    strava["requests"] = []
+    assert run(tmp_path)["complete"]
+    assert strava["requests"] == []
@@ -0,0 +1,65 @@
+from datetime import datetime
+
+import pytest
+
+from strava_server import digests
+from strava_server.digests import DigestIndex
+from strava_server.store import ActivityStore
+
+ATHLETE_ID = 4001
+
+
+def activity(activity_id: int, start_date: str, distance: float = 10000.0) -> dict:
+    return {"id": activity_id, "athlete": {"id": ATHLETE_ID}, "name": f"Run {activity_id}", "type": "Run",
+            "start_date": start_date, "distance": distance, "moving_time": 3000}
+
+
+@pytest.fixture
+def store_and_index():
+    store = ActivityStore()
+    index = DigestIndex(sync_ttl=60)
+    store.subscribe(index.on_store_change)
+    store.ingest("tok", [activity(1, "2026-09-15T07:00:00Z"), activity(2, "2026-10-01T07:00:00Z")])
+    return store, index
+
+
+def test_ingest_rebuilds_only_the_affected_periods(store_and_index, monkeypatch):
+    store, index = store_and_index
+    rebuilt = []
+    rebuild = index._rebuild
+    monkeypatch.setattr(index, "_rebuild", lambda key: rebuilt.append(key) or rebuild(key))
+    september = index._digests[(ATHLETE_ID, "monthly", "2026-09")]
+
+    store.ingest("tok", [activity(3, "2026-10-02T07:00:00Z", distance=5000.0)])
+
+    assert sorted(rebuilt) == [(ATHLETE_ID, "daily", "2026-10-02"), (ATHLETE_ID, "monthly", "2026-10"),
+                               (ATHLETE_ID, "weekly", "2026-W40")]
+    assert index._digests[(ATHLETE_ID, "monthly", "2026-09")] is september
+    october = index.digest(ATHLETE_ID, "monthly", datetime(2026, 10, 1))
+    assert october["totals"]["activities"] == 2
+    assert october["totals"]["distance_km"] == 15.0
+
+
+def test_moved_activity_rebuilds_old_and_new_periods(store_and_index):
+    store, index = store_and_index
+    store.upsert(ATHLETE_ID, activity(1, "2026-10-03T07:00:00Z"))
+
+    assert (ATHLETE_ID, "monthly", "2026-09") not in index._digests
+    assert index.digest(ATHLETE_ID, "monthly", datetime(2026, 10, 1))["totals"]["activities"] == 2
+
+
+def test_covers_expires_after_ttl_until_marked_synced(store_and_index, monkeypatch):
+    store, index = store_and_index
+    now = [1000.0]
+    monkeypatch.setattr(digests.time, "monotonic", lambda: now[0])
+    start = datetime(2026, 9, 28)
+
+    assert not index.covers(ATHLETE_ID, "weekly", start)
+    index.mark_synced(ATHLETE_ID, "weekly", start)
+    assert index.covers(ATHLETE_ID, "weekly", start)
+    assert not index.covers(ATHLETE_ID, "weekly", datetime(2026, 10, 5))
+
+    now[0] += 60
+    assert not index.covers(ATHLETE_ID, "weekly", start)
+    index.mark_synced(ATHLETE_ID, "weekly", start)
+    assert index.covers(ATHLETE_ID, "weekly", start)
@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+
+from strava_server import executor
+
+SAMPLES = 25000
+
+
+def summarize(streams):
+    """Module-level so the process pool can import it."""
+    heartrate = streams["heartrate"]["data"]
+    latlng = streams["latlng"]["data"]
+    return {
+        "missing_hr": sum(v is None for v in heartrate),
+        "hr_total": sum(v for v in heartrate if v is not None),
+        "missing_latlng": sum(p is None for p in latlng),
+        "moving": [v for v in streams["moving"]["data"][:5]],
+        "first_latlng": latlng[1],
+    }
+
+
+@pytest.fixture
+def process_pool(monkeypatch):
+    executor.shutdown_executor()
+    monkeypatch.setattr(executor, "EXECUTOR_KIND", "process")
+    monkeypatch.setattr(executor, "OFFLOAD_MIN_SAMPLES", 20000)
+    yield
+    executor.shutdown_executor()
+
+
+def test_offloaded_streams_with_missing_samples_match_inline(process_pool):
+    streams = {
+        "heartrate": {"data": [None if i % 100 == 0 else 120.0 + i % 30 for i in range(SAMPLES)]},
+        "latlng": {"data": [None if i % 500 == 0 else [52.0 + i * 1e-6, 13.0] for i in range(SAMPLES)]},
+        "moving": {"data": [None, True, False, True, None] + [True] * (SAMPLES - 5)},
+    }
+    offloaded = asyncio.run(executor.run_stream_task(summarize, streams))
+    assert offloaded == summarize(streams)
+    assert offloaded["missing_hr"] == SAMPLES // 100
+
+
+def test_pack_round_trip_keeps_none():
+    streams = [{"watts": {"data": [None, 1.5, None]}, "latlng": {"data": [None, [1.0, 2.0]]}}]
+    block, layout = executor.pack_streams(streams)
+    try:
+        assert executor.unpack_streams(block.buf, layout, 1) == [
+            {"watts": {"data": [None, 1.5, None]}, "latlng": {"data": [None, [1.0, 2.0]]}}]
+    finally:
+        block.close()
+        block.unlink()
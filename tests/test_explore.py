@@ -0,0 +1,54 @@
+import asyncio
+
+import httpx
+import pytest
+
+from strava_server import explore, utils
+from strava_server.cache import response_cache
+from strava_server.ratelimit import RateBudget
+
+BOUNDS = [52.0, 13.0, 52.1, 13.1]
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    calls = []
+
+    async def fake_request(method, endpoint, token=None, params=None, **kwargs):
+        calls.append((token, params["bounds"]))
+        sw_lat, sw_lng = map(float, params["bounds"].split(",")[:2])
+        return httpx.Response(200, json={"segments": [
+            {"id": round(sw_lat * 1000) * 100000 + round(sw_lng * 1000), "start_latlng": [sw_lat + 0.01, sw_lng + 0.01]}
+        ]})
+
+    monkeypatch.setattr(utils, "make_strava_request", fake_request)
+    monkeypatch.setattr(explore, "explore_budget", RateBudget(100))
+    yield calls
+    response_cache.invalidate("/segments/explore")
+
+
+def test_tiles_are_shared_between_tokens(upstream):
+    first = asyncio.run(explore.explore_tiled("token-a", BOUNDS, {"activity_type": "running"}))
+    second = asyncio.run(explore.explore_tiled("token-b", BOUNDS, {"activity_type": "running"}))
+    assert first["tiles"] == 4 and len(first["segments"]) == 4
+    assert second["segments"] == first["segments"]
+    assert [token for token, _ in upstream] == ["token-a"] * 4
+
+
+def test_stale_tile_revalidation_is_charged_to_the_budget(upstream, monkeypatch):
+    asyncio.run(explore.explore_tiled("token-a", BOUNDS, {}))
+    for key in list(response_cache._entries):
+        if key[0] == "/segments/explore":
+            response_cache.set(key, response_cache.get(key), ttl=-1)
+    monkeypatch.setattr(explore, "explore_budget", RateBudget(1, burst=1))
+
+    async def explore_and_settle():
+        result = await explore.explore_tiled("token-a", BOUNDS, {})
+        await asyncio.sleep(0)
+        return result
+
+    upstream.clear()
+    result = asyncio.run(explore_and_settle())
+    # All tiles are answered from the expired cache, but only one is refreshed within the budget
+    assert len(result["segments"]) == 4 and result["pending_tiles"] == 0
+    assert len(upstream) == 1
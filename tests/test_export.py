@@ -0,0 +1,68 @@
+import csv
+import io
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from strava_server import export, server
+from strava_server.ratelimit import RateBudget
+
+HEADERS = {"Authorization": "Bearer export-test-token"}
+ACTIVITIES = [{"id": i, "athlete": {"id": 7}, "name": f"Run {i}", "type": "Run", "sport_type": "Run",
+               "start_date": f"2026-10-0{i}T07:00:00Z", "distance": 5000.0 + i, "moving_time": 1500}
+              for i in (1, 2, 3)]
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    requests = []
+
+    async def fake_request(method, endpoint, token=None, params=None, **kwargs):
+        requests.append((endpoint, params))
+        if endpoint == "/athlete/activities":
+            return httpx.Response(200, json=ACTIVITIES if params["page"] == 1 else [])
+        return httpx.Response(200, json={"time": {"data": [0, 1, 2]}, "heartrate": {"data": [120, None, 122]},
+                                         "distance": {"data": [0.0, 3.0, 6.0]}})
+
+    monkeypatch.setattr(export, "make_strava_request", fake_request)
+    monkeypatch.setattr(export, "export_budget", RateBudget(100))
+    return requests
+
+
+def read_csv(response) -> list:
+    return list(csv.DictReader(io.StringIO(response.text)))
+
+
+def test_activities_csv(upstream):
+    response = TestClient(server.app).get("/export/activities", headers=HEADERS)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = read_csv(response)
+    assert list(rows[0]) == list(export.ACTIVITY_COLUMNS)
+    assert [(r["id"], r["athlete_id"], r["distance"]) for r in rows] == [("1", "7", "5001.0"), ("2", "7", "5002.0"),
+                                                                          ("3", "7", "5003.0")]
+
+
+def test_streams_csv_only_has_requested_keys(upstream):
+    response = TestClient(server.app).get("/export/streams", headers=HEADERS, params={"keys": ["time", "heartrate"]})
+    assert response.status_code == 200
+    rows = read_csv(response)
+    assert len(rows) == 9
+    assert rows[1] == {**{column: "" for column in export.STREAM_COLUMNS},
+                       "activity_id": "1", "time": "1", "heartrate": ""}
+    assert rows[2]["heartrate"] == "122" and rows[2]["distance"] == ""
+    stream_requests = [params for endpoint, params in upstream if endpoint.endswith("/streams")]
+    assert stream_requests == [{"keys": "time,heartrate", "key_by_type": "true"}] * 3
+
+
+@pytest.mark.parametrize("path,params", [
+    ("/export/streams", {"keys": ["bogus"]}),
+    ("/export/streams", {"keys": ["time"], "source": "elsewhere"}),
+    ("/export/activities", {"source": "elsewhere"}),
+    ("/export/activities", {"format": "xlsx"}),
+])
+def test_invalid_parameters_are_rejected_before_streaming(upstream, path, params):
+    response = TestClient(server.app).get(path, headers=HEADERS, params=params)
+    assert response.status_code == 400
+    assert upstream == []
@@ -0,0 +1,63 @@
+import random
+
+from strava_server.gear import GearSeries
+from strava_server.records import ActivityRecord
+
+
+def record(activity_id: int, start: int) -> ActivityRecord:
+    return ActivityRecord(activity_id, 1, "Ride", "Ride", "Ride", start, 1000.0 * activity_id, 60 * activity_id, 0, 0.0)
+
+
+def test_usage_is_the_same_whatever_the_ingest_order():
+    records = [record(i, 1_000_000 + 3600 * i) for i in range(1, 301)]
+    expected = None
+    for order in (records, records[::-1], random.Random(7).sample(records, len(records))):
+        series = GearSeries()
+        for r in order:
+            series.add(r)
+        usage = series.usage(1_000_000 + 3600 * 50, 1_000_000 + 3600 * 150)
+        assert usage["activities"] == 100
+        assert usage["distance_km"] == sum(range(50, 150))
+        expected = expected or usage
+        assert usage == expected
+
+
+def test_remove_and_add_after_a_query_update_the_totals():
+    series = GearSeries()
+    for i in (3, 1, 2):
+        series.add(record(i, 1000 * i))
+    assert series.usage()["distance_km"] == 6.0
+    series.remove(1)
+    assert series.usage()["distance_km"] == 5.0
+    series.add(record(4, 4000))
+    series.add(record(1, 1000))
+    assert series.usage(after=1000, before=4000) == {"activities": 3, "distance_km": 6.0, "moving_time_h": 0.1}
+
+
+def test_monthly_usage_only_spans_months_with_activities(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from strava_server import server
+    from strava_server.gear import gear_index
+    from strava_server.routers import api
+
+    async def athlete(endpoint, token=None, **kwargs):
+        return {"id": 4242}
+
+    monkeypatch.setattr(api, "fetch_json", athlete)
+    for i, start in enumerate((1_780_000_000, 1_782_000_000, 1_785_000_000)):
+        activity = record(i + 1, start)
+        activity.gear_id = "b1"
+        gear_index.on_store_change("upsert", 4242, activity)
+    client = TestClient(server.app)
+    headers = {"Authorization": "Bearer gear-test-token"}
+    try:
+        monthly = client.get("/gear/b1/usage", headers=headers,
+                             params={"group_by": "month", "after": 0, "before": 300_000_000_000}).json()["monthly"]
+        assert list(monthly) == ["2026-05", "2026-06", "2026-07"]
+        assert sum(m["activities"] for m in monthly.values()) == 3
+        empty = client.get("/gear/b1/usage", headers=headers,
+                           params={"group_by": "month", "after": 1_790_000_000}).json()
+        assert empty["monthly"] == {} and empty["activities"] == 0
+    finally:
+        gear_index.on_store_change("forget", 4242, None)
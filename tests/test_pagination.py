@@ -0,0 +1,59 @@
+import asyncio
+
+from strava_server import utils
+
+ITEMS = [{"id": i, "cursor": f"c{i}"} for i in range(450)]
+
+
+def fake_fetch_json(requests: list, in_flight: list):
+    active = [0]
+
+    async def fetch_json(endpoint, token=None, params=None, ttl=None):
+        requests.append(dict(params))
+        active[0] += 1
+        in_flight.append(active[0])
+        await asyncio.sleep(0.01)
+        active[0] -= 1
+        if "after_cursor" in params or "page_size" in params:
+            start = int(params["after_cursor"][1:]) + 1 if "after_cursor" in params else 0
+            return ITEMS[start:start + params["page_size"]]
+        size = params["per_page"]
+        return ITEMS[(params["page"] - 1) * size:params["page"] * size]
+
+    return fetch_json
+
+
+def test_numbered_pages_are_fetched_ahead_in_order(monkeypatch):
+    requests, in_flight = [], []
+    monkeypatch.setattr(utils, "fetch_json", fake_fetch_json(requests, in_flight))
+    items = asyncio.run(utils.fetch_all_pages("/activities/1/kudos", "tok"))
+    assert [item["id"] for item in items] == list(range(450))
+    assert requests[0] == {"per_page": 200, "page": 1}
+    assert max(in_flight) > 1
+
+
+def test_short_first_page_costs_one_request(monkeypatch):
+    requests, in_flight = [], []
+    monkeypatch.setattr(utils, "fetch_json", fake_fetch_json(requests, in_flight))
+    items = asyncio.run(utils.fetch_all_pages("/activities/1/kudos", "tok", per_page=500))
+    assert len(items) == 450
+    assert len(requests) == 1
+
+
+def test_limit_caps_items_and_pages(monkeypatch):
+    requests, in_flight = [], []
+    monkeypatch.setattr(utils, "fetch_json", fake_fetch_json(requests, in_flight))
+    items = asyncio.run(utils.fetch_all_pages("/activities/1/kudos", "tok", limit=250))
+    assert len(items) == 250
+    assert sorted(r["page"] for r in requests) == [1, 2]
+
+
+def test_cursor_pages_are_fetched_one_at_a_time(monkeypatch):
+    requests, in_flight = [], []
+    monkeypatch.setattr(utils, "fetch_json", fake_fetch_json(requests, in_flight))
+    items = asyncio.run(utils.fetch_all_pages("/activities/1/comments", "tok", size_param="page_size",
+                                              cursor_param="after_cursor"))
+    assert [item["id"] for item in items] == list(range(450))
+    assert requests == [{"page_size": 200}, {"page_size": 200, "after_cursor": "c199"},
+                        {"page_size": 200, "after_cursor": "c399"}]
+    assert max(in_flight) == 1
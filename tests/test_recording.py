@@ -0,0 +1,23 @@
+import asyncio
+import functools
+import json
+
+from strava_server import recording, resilience, utils
+
+
+def test_replay_is_not_hedged(tmp_path, monkeypatch):
+    path = tmp_path / "session.jsonl"
+    entries = [{"kind": "upstream", "method": "GET", "endpoint": "/athlete", "params": {}, "token": "t",
+                "status": 200, "elapsed": 0.1, "content_type": "application/json", "body": json.dumps({"n": n})}
+               for n in (1, 2)]
+    path.write_text("".join(json.dumps(entry) + "\n" for entry in entries))
+    monkeypatch.setattr(recording, "replay", recording.Replay(str(path), speed=1))
+    # Hedge well before the recorded latency; a hedged replay would consume both recordings at once
+    monkeypatch.setattr(utils, "hedged", functools.partial(resilience.hedged, delay=0.01))
+
+    async def two_requests():
+        first = await utils.make_strava_request("GET", "/athlete", "token")
+        second = await utils.make_strava_request("GET", "/athlete", "token")
+        return first.json(), second.json()
+
+    assert asyncio.run(two_requests()) == ({"n": 1}, {"n": 2})
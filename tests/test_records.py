@@ -0,0 +1,19 @@
+from strava_server.export import ACTIVITY_COLUMNS, activity_row
+from strava_server.records import ActivityRecord
+
+SUMMARY = {
+    "id": 1, "athlete": {"id": 2}, "name": "Lunch Run", "type": "Run", "sport_type": "TrailRun",
+    "start_date": "2026-10-01T10:00:00Z", "start_date_local": "2026-10-01T12:00:00Z",
+    "timezone": "(GMT+01:00) Europe/Paris", "distance": 10000.0, "moving_time": 3000, "elapsed_time": 3100,
+    "total_elevation_gain": 120.0, "average_speed": 3.3, "max_speed": 5.1, "average_heartrate": 150.0,
+    "max_heartrate": 181.0, "average_watts": 250.0, "weighted_average_watts": 262.0, "kilojoules": 700.0,
+    "average_cadence": 88.0, "suffer_score": 60.0, "gear_id": "g1", "trainer": False, "commute": True,
+    "manual": False, "private": True, "kudos_count": 4, "map": {"summary_polyline": "abc"},
+}
+
+
+def test_store_export_row_matches_strava_row():
+    record = ActivityRecord.from_summary(SUMMARY)
+    assert activity_row(record.to_summary()) == activity_row(SUMMARY)
+    assert None not in activity_row(record.to_summary())
+    assert len(activity_row(SUMMARY)) == len(ACTIVITY_COLUMNS)
@@ -0,0 +1,53 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from fastmcp import Client
+
+from strava_server import server, utils
+from strava_server.cache import response_cache
+
+TOKEN = "stale-test-token"
+ZONES = {"heart_rate": {"custom_zones": False, "zones": [{"min": 0, "max": 120}]}}
+
+
+@pytest.fixture
+def stale_zones(monkeypatch):
+    async def failing_request(method, endpoint, token=None, **kwargs):
+        raise HTTPException(status_code=503, detail="Strava is down")
+
+    monkeypatch.setattr(utils, "make_strava_request", failing_request)
+    response_cache.set(response_cache.make_key("/athlete/zones", TOKEN), ZONES, ttl=-60)
+    yield
+    response_cache.invalidate(token=TOKEN)
+
+
+def test_stale_dict_response_is_marked_in_header_and_body(stale_zones):
+    response = TestClient(server.app).get("/athlete/zones", headers={"Authorization": f"Bearer {TOKEN}"})
+    assert response.status_code == 200
+    assert response.headers["X-Strava-Cache"].startswith("stale; age=")
+    body = response.json()
+    assert body["heart_rate"] == ZONES["heart_rate"]
+    assert body["_cache"]["stale"] is True
+    assert body["_cache"]["age"] >= 0
+
+
+def test_tool_result_reports_staleness(stale_zones):
+    async def call():
+        async with Client(server.server) as client:
+            return await client.call_tool("getAuthenticatedAthleteZones", {"authorization": f"Bearer {TOKEN}"})
+
+    result = asyncio.run(call())
+    assert json.loads(result.content[0].text)["_cache"]["stale"] is True
+
+
+def test_fresh_response_has_no_cache_field(monkeypatch):
+    response_cache.set(response_cache.make_key("/athlete/zones", TOKEN), ZONES)
+    try:
+        response = TestClient(server.app).get("/athlete/zones", headers={"Authorization": f"Bearer {TOKEN}"})
+    finally:
+        response_cache.invalidate(token=TOKEN)
+    assert "X-Strava-Cache" not in response.headers
+    assert "_cache" not in response.json()
@@ -0,0 +1,79 @@
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from strava_server import server
+from strava_server.routers import api
+from strava_server.streams import aligned_split_summaries, downsample, interpolate
+
+HEADERS = {"Authorization": "Bearer streams-test-token"}
+
+
+def test_downsample_keeps_streams_aligned():
+    streams = {"time": {"data": list(range(1000))}, "heartrate": {"data": [100 + i % 37 for i in range(1000)]}}
+    for method in ("lttb", "minmax"):
+        reduced = downsample(streams, 100, method)
+        assert len(reduced["heartrate"]["data"]) <= 100
+        assert len(reduced["time"]["data"]) == len(reduced["heartrate"]["data"])
+
+
+def test_downsample_rejects_unknown_method():
+    with pytest.raises(ValueError):
+        downsample({"heartrate": {"data": [1, 2, 3]}}, 2, "average")
+
+
+def test_segment_streams_are_always_keyed_by_type(monkeypatch):
+    requests = []
+
+    async def fake_request(method, endpoint, token=None, params=None, **kwargs):
+        requests.append(params)
+        return httpx.Response(200, json={"distance": {"data": [float(i) for i in range(50)]},
+                                         "altitude": {"data": [float(i % 7) for i in range(50)]}})
+
+    monkeypatch.setattr(api, "make_strava_request", fake_request)
+    response = TestClient(server.app).get("/segments/1/streams", headers=HEADERS, params={
+        "keys": ["distance", "altitude"], "key_by_type": "false", "max_points": 10})
+    assert response.status_code == 200
+    assert requests[0]["key_by_type"] == "true"
+    assert len(response.json()["altitude"]["data"]) == 10
+
+
+def test_unknown_downsample_method_is_rejected():
+    client = TestClient(server.app)
+    for path in ("/activities/1/streams", "/segment_efforts/1/streams", "/segments/1/streams"):
+        response = client.get(path, headers=HEADERS, params={"keys": ["distance"], "max_points": 10,
+                                                             "downsample_method": "average"})
+        assert response.status_code == 400
+
+
+def test_interpolate_uses_the_present_neighbour_of_a_dropout():
+    assert interpolate([0, 10, 20, 30], [100, None, None, 130], [0, 5, 15, 25, 30]) == [100, 100, None, 130, 130]
+
+
+def test_compare_splits_with_heart_rate_dropouts():
+    n = 2000
+    streams = {"time": {"data": list(range(n))}, "distance": {"data": [i * 3.0 for i in range(n)]},
+               "heartrate": {"data": [None if i % 10 == 0 or 500 <= i < 900 else 150 for i in range(n)]},
+               "watts": {"data": [None] * n}}
+    [splits] = aligned_split_summaries([streams], "distance", 100.0, 5000.0, 10)
+    assert len(splits) == 5
+    assert all(split["heartrate"] == 150 for split in splits if split["heartrate"] is not None)
+    assert all(split["watts"] is None for split in splits)
+
+
+def test_compare_rejects_tiny_splits(monkeypatch):
+    from strava_server.routers import analysis
+
+    async def long_ride(endpoint, token=None, keys=None, **kwargs):
+        return {"time": {"data": [0, 100000]}, "distance": {"data": [0.0, 2_000_000.0]}}
+
+    monkeypatch.setattr(analysis, "fetch_streams", long_ride)
+    client = TestClient(server.app)
+    params = {"activity_ids": [1, 2]}
+    assert client.get("/analysis/compare", headers=HEADERS, params={**params, "split": 0.001}).status_code == 422
+    assert client.get("/analysis/compare", headers=HEADERS, params={**params, "split": 20}).status_code == 400
+    assert client.get("/analysis/compare", headers=HEADERS,
+                      params={**params, "grid": "time", "split": 5}).status_code == 422
+    response = client.get("/analysis/compare", headers=HEADERS, params={**params, "split": 100})
+    assert response.status_code == 400 and "at least 200" in response.json()["detail"]
+    assert client.get("/analysis/compare", headers=HEADERS, params={**params, "split": 1000}).status_code == 200
@@ -0,0 +1,50 @@
+import json
+import os
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+
+# Tracing is configured at import, so the request runs in a fresh interpreter
+REQUEST = textwrap.dedent("""
+    from fastapi.testclient import TestClient
+    from strava_server.server import app
+
+    response = TestClient(app).get("/athlete/zones", headers={"Authorization": "Bearer trace-token"})
+    assert response.status_code == 200, response.text
+""")
+
+
+def test_file_tracing_records_nested_request_spans(tmp_path):
+    spans_path = tmp_path / "spans.jsonl"
+    recording_path = tmp_path / "upstream.jsonl"
+    recording_path.write_text(json.dumps({
+        "kind": "upstream", "method": "GET", "endpoint": "/athlete/zones", "params": {}, "token": "t",
+        "status": 200, "elapsed": 0, "content_type": "application/json", "body": json.dumps({"heart_rate": {}}),
+    }) + "\n")
+    env = {**os.environ, "PYTHONPATH": str(SRC), "STRAVA_TRACING": f"file:{spans_path}",
+           "STRAVA_REPLAY": str(recording_path), "STRAVA_REPLAY_SPEED": "0", "STRAVA_RECORD": "",
+           "STRAVA_PREFETCH": "0"}
+    subprocess.run([sys.executable, "-c", REQUEST], env=env, check=True, cwd=tmp_path)
+
+    spans = [json.loads(line) for line in spans_path.read_text().splitlines()]
+    by_id = {s["span_id"]: s for s in spans}
+
+    def parent(name: str) -> str:
+        [record] = [s for s in spans if s["name"] == name]
+        return by_id[record["parent_span_id"]]["name"] if record["parent_span_id"] else None
+
+    assert parent("http.request") is None
+    assert parent("route") == "http.request"
+    assert parent("handler") == "route"
+    assert parent("auth.extract_token") == "handler"
+    assert parent("cache.lookup") == "handler"
+    assert parent("strava.request") == "handler"
+    assert parent("json.decode") == "handler"
+    assert len({s["trace_id"] for s in spans}) == 1
+    [route] = [s for s in spans if s["name"] == "route"]
+    assert route["attributes"]["operation_id"] == "getAuthenticatedAthleteZones"
+    [lookup] = [s for s in spans if s["name"] == "cache.lookup"]
+    assert lookup["attributes"]["hit"] is False
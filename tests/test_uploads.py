@@ -0,0 +1,96 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from strava_server import uploads
+from strava_server.cache import response_cache
+
+TOKEN = "upload-test-token"
+
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    root = tmp_path / "uploads"
+    root.mkdir()
+    (root / "ride.fit").write_bytes(b"fit")
+    monkeypatch.setattr(uploads, "UPLOAD_DIR", str(root))
+    monkeypatch.setattr(uploads, "POLL_INITIAL_DELAY", 0.001)
+    monkeypatch.setattr(uploads, "POLL_MAX_DELAY", 0.004)
+    return root
+
+
+def test_path_inside_upload_dir_resolves(upload_dir):
+    assert uploads.resolve_upload_path("ride.fit") == (upload_dir / "ride.fit").resolve()
+
+
+@pytest.mark.parametrize("relative", ["../secret.fit", "nested/../../secret.fit", "/etc/passwd.fit", "escape.fit"])
+def test_paths_outside_upload_dir_are_rejected(upload_dir, relative):
+    secret = upload_dir.parent / "secret.fit"
+    secret.write_bytes(b"secret")
+    (upload_dir / "nested").mkdir()
+    (upload_dir / "escape.fit").symlink_to(secret)
+    with pytest.raises(HTTPException) as exc:
+        uploads.resolve_upload_path(relative)
+    assert exc.value.status_code == 400
+    assert "outside the upload directory" in exc.value.detail
+
+
+def fake_strava(statuses: list, requests: list):
+    async def make_strava_request(method, endpoint, token=None, **kwargs):
+        requests.append((method, endpoint))
+        if method == "POST":
+            return httpx.Response(201, json={"id": 7, "status": "Your activity is still being processed."})
+        status = statuses.pop(0)
+        if isinstance(status, Exception):
+            raise status
+        return httpx.Response(200, json={"id": 7, **status})
+
+    return make_strava_request
+
+
+def run_upload(options: dict = None):
+    async def main():
+        manager = uploads.UploadManager(concurrency=1)
+        job = manager.submit(TOKEN, ["ride.fit"], options or {})
+        await asyncio.gather(*manager._tasks)
+        return job
+
+    return asyncio.run(main())
+
+
+def test_polling_backs_off_until_ready(upload_dir, monkeypatch):
+    requests = []
+    statuses = [{}, HTTPException(status_code=503, detail="Strava is down"), {}, {"activity_id": 99}]
+    monkeypatch.setattr(uploads, "make_strava_request", fake_strava(statuses, requests))
+    list_key = response_cache.make_key("/athlete/activities", TOKEN)
+    response_cache.set(list_key, [])
+    delays = []
+    sleep = asyncio.sleep
+
+    async def recording_sleep(delay):
+        delays.append(delay)
+        await sleep(0)
+
+    monkeypatch.setattr(uploads.asyncio, "sleep", recording_sleep)
+    job = run_upload({"name": "Lunch Ride"})
+
+    [upload] = job.files
+    assert (upload.state, upload.upload_id, upload.activity_id, upload.polls) == ("ready", 7, 99, 4)
+    assert requests == [("POST", "/uploads")] + [("GET", "/uploads/7")] * 4
+    assert delays == [0.001, 0.002, 0.004, 0.004]
+    assert response_cache.get(list_key) is None
+    assert job.done
+
+
+def test_polling_stops_on_processing_error(upload_dir, monkeypatch):
+    requests = []
+    statuses = [{}, {"error": "Duplicate of activity 42"}]
+    monkeypatch.setattr(uploads, "make_strava_request", fake_strava(statuses, requests))
+    job = run_upload()
+
+    [upload] = job.files
+    assert (upload.state, upload.error, upload.activity_id) == ("error", "Duplicate of activity 42", None)
+    assert len(requests) == 3
+    assert job.to_dict()["counts"] == {"error": 1}
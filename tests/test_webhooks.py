@@ -0,0 +1,97 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from strava_server import events
+from strava_server.cache import response_cache
+from strava_server.routers import webhooks
+from strava_server.store import activity_store
+
+ATHLETE_ID = 2001
+ACTIVITY_ID = 3001
+
+
+def activity(**values) -> dict:
+    return {"id": ACTIVITY_ID, "athlete": {"id": ATHLETE_ID}, "name": "Morning Ride", "type": "Ride",
+            "start_date": "2026-10-01T07:00:00Z", "distance": 20000.0, "moving_time": 3600, **values}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(webhooks, "WEBHOOK_VERIFY_TOKEN", "secret")
+    monkeypatch.setattr(webhooks, "WEBHOOK_SUBSCRIPTION_ID", None)
+    app = FastAPI()
+    app.include_router(webhooks.webhooks_router)
+    yield TestClient(app)
+    # The consumer task is not running here, so events stay queued until handled below
+    while not events.webhook_queue.empty():
+        events.webhook_queue.get_nowait()
+    activity_store.forget_athlete(ATHLETE_ID)
+    response_cache.invalidate(f"/activities/{ACTIVITY_ID}")
+
+
+def post_and_handle(client: TestClient, event: dict) -> None:
+    response = client.post("/webhook", json={"subscription_id": 1, "owner_id": ATHLETE_ID,
+                                             "object_id": ACTIVITY_ID, "object_type": "activity", **event})
+    assert response.json() == {"status": "queued"}
+    asyncio.run(events.handle_event(events.webhook_queue.get_nowait()))
+
+
+def test_webhooks_hidden_without_verify_token(monkeypatch):
+    monkeypatch.setattr(webhooks, "WEBHOOK_VERIFY_TOKEN", None)
+    app = FastAPI()
+    app.include_router(webhooks.webhooks_router)
+    client = TestClient(app)
+    params = {"hub.mode": "subscribe", "hub.challenge": "c", "hub.verify_token": "anything"}
+    assert client.get("/webhook", params=params).status_code == 404
+    assert client.post("/webhook", json={"object_type": "activity"}).status_code == 404
+
+
+def test_verify_token_must_match(client):
+    params = {"hub.mode": "subscribe", "hub.challenge": "c"}
+    assert client.get("/webhook", params={**params, "hub.verify_token": "wrong"}).status_code == 403
+    assert client.get("/webhook", params={**params, "hub.verify_token": "secret"}).json() == {"hub.challenge": "c"}
+
+
+def test_update_refetches_activity_and_invalidates_cache(client, monkeypatch):
+    activity_store.ingest("tok", [activity()])
+    detail_key = response_cache.make_key(f"/activities/{ACTIVITY_ID}", "tok")
+    list_key = response_cache.make_key("/athlete/activities", "tok")
+    response_cache.set(detail_key, activity())
+    response_cache.set(list_key, [activity()])
+    requested = []
+
+    async def fake_request(method, endpoint, token=None, **kwargs):
+        requested.append((method, endpoint, token))
+        return httpx.Response(200, json=activity(name="Renamed Ride"))
+
+    monkeypatch.setattr(events, "make_strava_request", fake_request)
+    post_and_handle(client, {"aspect_type": "update", "updates": {"title": "Renamed Ride"}})
+
+    assert requested == [("GET", f"/activities/{ACTIVITY_ID}", "tok")]
+    assert response_cache.get(detail_key) is None
+    assert response_cache.get(list_key) is None
+    assert activity_store.get(ATHLETE_ID, ACTIVITY_ID).name == "Renamed Ride"
+
+
+def test_update_without_token_applies_translated_fields(client):
+    activity_store.upsert(ATHLETE_ID, activity())
+    post_and_handle(client, {"aspect_type": "update", "updates": {"title": "Evening Ride", "type": "Run"}})
+
+    record = activity_store.get(ATHLETE_ID, ACTIVITY_ID)
+    assert (record.name, record.type) == ("Evening Ride", "Run")
+
+
+def test_delete_removes_activity(client):
+    activity_store.upsert(ATHLETE_ID, activity())
+    post_and_handle(client, {"aspect_type": "delete", "updates": {}})
+
+    assert activity_store.get(ATHLETE_ID, ACTIVITY_ID) is None
+
+
+def test_activity_updates_translation():
+    assert events.activity_updates({"title": "A", "private": "true", "type": "Run"}) == \
+        {"name": "A", "private": True, "type": "Run"}